@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
@@ -6,6 +6,8 @@ from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from celery import Celery
+import stripe
+from stripe.http_client import RequestsClient
 import os
 import logging
 from datetime import datetime, timezone
@@ -13,6 +15,7 @@ from datetime import datetime, timezone
 # Import extensions
 from app.models import db, User
 from app.config import get_config
+from app.utils.json_provider import OrjsonProvider
 
 # Initialize extensions
 migrate = Migrate()
@@ -38,6 +41,9 @@ def create_app(config_name=None):
     config_class = get_config()
     app.config.from_object(config_class)
     
+    # Encode JSON responses with orjson
+    app.json = OrjsonProvider(app)
+    
     # Initialize extensions with app
     db.init_app(app)
     migrate.init_app(app, db)
@@ -45,9 +51,16 @@ def create_app(config_name=None):
     cors.init_app(app, origins=app.config['CORS_ORIGINS'], supports_credentials=True)
     limiter.init_app(app)
     
+    # One AuthService per app, so the JWT settings it resolves are reused
+    from app.services.auth_service import AuthService
+    app.extensions['auth_service'] = AuthService()
+    
     # Configure Celery
     configure_celery(app, celery)
     
+    # Configure Stripe
+    configure_stripe(app)
+    
     # Configure logging
     configure_logging(app)
     
@@ -78,8 +91,9 @@ def create_app(config_name=None):
     def health_check():
         """Health check endpoint for monitoring."""
         try:
-            # Check database connection
-            db.session.execute('SELECT 1')
+            # Check database connection on a pooled connection, bypassing the ORM
+            with db.engine.connect() as connection:
+                connection.exec_driver_sql('SELECT 1')
             db_status = 'healthy'
         except Exception as e:
             db_status = f'unhealthy: {str(e)}'
@@ -110,18 +124,51 @@ def configure_celery(app, celery):
         task_send_sent_event=True,
         worker_send_task_events=True,
         result_expires=3600,  # 1 hour
+        # CV generation/editing mostly waits on Gemini and pdflatex, so it
+        # gets its own queue for a high-concurrency thread-pool worker
+        task_routes={
+            'generate_cv_task': {'queue': 'cv'},
+            'edit_cv_task': {'queue': 'cv'},
+        },
+        # Long tasks: take one at a time and ack on completion, so a busy
+        # worker doesn't sit on queued CVs another worker could start
+        task_acks_late=True,
+        worker_prefetch_multiplier=1,
+        # ...and requeue a task whose pool process died mid-run
+        task_reject_on_worker_lost=True,
     )
     
     # Create task base class with app context
     class ContextTask(celery.Task):
         """Make celery tasks work with Flask app context."""
         def __call__(self, *args, **kwargs):
+            # A task called directly from another task runs in its context
+            if has_app_context():
+                return self.run(*args, **kwargs)
             with app.app_context():
                 return self.run(*args, **kwargs)
     
     celery.Task = ContextTask
 
 
+def configure_stripe(app):
+    """Configure the Stripe client once for the process."""
+    stripe.api_key = app.config.get('STRIPE_SECRET_KEY')
+    
+    # Retries are idempotent (stripe-python adds idempotency keys to them)
+    stripe.max_network_retries = app.config.get('STRIPE_MAX_NETWORK_RETRIES', 2)
+    
+    # Keeps a requests.Session per thread, so calls reuse keep-alive
+    # TLS connections to api.stripe.com instead of handshaking each time,
+    # and no thread ever waits on another's connection pool. The timeout
+    # replaces the library's 80s default so a slow Stripe can't pin workers
+    if not isinstance(stripe.default_http_client, RequestsClient):
+        stripe.default_http_client = RequestsClient(
+            timeout=app.config.get('STRIPE_TIMEOUT', 10),
+            verify_ssl_certs=True
+        )
+
+
 def register_blueprints(app):
     """Register all application blueprints."""
     
@@ -1,10 +1,15 @@
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import (
+    Blueprint, request, jsonify, send_file, current_app, Response, stream_with_context
+)
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from app.models import db, CV, CVStatus, DownloadToken
-from app.services.cv_service import CVService
+from app.services.cv_service import CVService, TERMINAL_STATUSES
 from app.tasks.cv_tasks import generate_cv_task, edit_cv_task
-from app.utils.decorators import jwt_required, generation_limit_check, validate_json
+from app.utils.decorators import (
+    jwt_required, generation_limit_check, generation_limit_response, validate_json
+)
+from app.utils.redis_client import get_redis, task_channel
 from app.utils.validators import (
     CVCreateSchema, CVUpdateSchema, CVFilterSchema, 
     format_validation_errors, validate_cv_uuid
@@ -12,6 +17,8 @@ from app.utils.validators import (
 from marshmallow import ValidationError
 from datetime import datetime, timezone, timedelta
 import os
+import json
+import time
 import logging
 
 # Create blueprint
@@ -28,6 +35,15 @@ cv_create_schema = CVCreateSchema()
 cv_update_schema = CVUpdateSchema()
 cv_filter_schema = CVFilterSchema()
 
+# What cv_filter_schema loads from an empty query string (just the defaults)
+DEFAULT_CV_FILTERS = cv_filter_schema.load({})
+
+# Columns read by the status endpoint
+STATUS_COLUMNS = [
+    'uuid', 'status', 'error_message', 'created_at', 'updated_at',
+    'generation_time', 'task_id', 'pdf_path', 'jpg_path'
+]
+
 logger = logging.getLogger(__name__)
 
 
@@ -45,13 +61,21 @@ def list_cvs():
     - search: Search in title and user data
     - sort_by: Sort field (default: created_at)
     - sort_order: Sort order (default: desc)
+    - fast_page: Skip the total count and return only has_next/has_prev (default: false)
+    - include_total: With fast_page, still compute the total count (default: false)
+    - after_created_at, after_id: Keyset cursor from a previous next_cursor;
+      replaces page when sorting by created_at
     """
     try:
         current_user = request.current_user
         
         # Validate query parameters
         try:
-            query_params = cv_filter_schema.load(request.args)
+            # A bare listing request needs no validation, only the defaults
+            if request.args:
+                query_params = cv_filter_schema.load(request.args)
+            else:
+                query_params = dict(DEFAULT_CV_FILTERS)
         except ValidationError as e:
             return jsonify(format_validation_errors(e.messages)), 400
         
@@ -66,7 +90,8 @@ def list_cvs():
                 'total': result['total'],
                 'pages': result['pages'],
                 'has_next': result['has_next'],
-                'has_prev': result['has_prev']
+                'has_prev': result['has_prev'],
+                'next_cursor': result['next_cursor']
             }
         }), 200
         
@@ -110,12 +135,18 @@ def create_cv():
         except ValidationError as e:
             return jsonify(format_validation_errors(e.messages)), 400
         
+        # Take the generation with the CV insert; a concurrent request may
+        # have spent the last one since generation_limit_check ran
+        if not current_user.use_generation():
+            db.session.rollback()
+            return generation_limit_response(current_user)
+        
         # Create CV record
         cv = CV(
             user_id=current_user.id,
             title=cv_data['title'],
             template_name=cv_data['template_name'],
-            user_data=str(cv_data['user_data']),  # Store as JSON string
+            user_data=json.dumps(cv_data['user_data'], ensure_ascii=False),  # Unescaped, so search sees real text
             job_description=cv_data['job_description'],
             status=CVStatus.PENDING
         )
@@ -124,21 +155,32 @@ def create_cv():
         db.session.commit()
         
         # Start async CV generation task
-        task = generate_cv_task.delay(
-            cv.id,
-            cv_data['user_data'],
-            cv_data['job_description'],
-            cv_data['template_name'],
-            current_user.user_tier.value
-        )
+        try:
+            task = generate_cv_task.delay(
+                cv.id,
+                cv_data['user_data'],
+                cv_data['job_description'],
+                cv_data['template_name'],
+                current_user.user_tier.value
+            )
+        except Exception as e:
+            # Nothing will generate this CV, so don't charge for it
+            logger.error(f'Failed to queue CV generation for CV {cv.id}: {str(e)}')
+            cv.status = CVStatus.FAILED
+            cv.error_message = 'CV generation could not be started'
+            current_user.refund_generation()
+            db.session.commit()
+            cv_service.invalidate_user_statistics(current_user.id)
+            return jsonify({
+                'error': 'Failed to create CV',
+                'message': 'CV generation is temporarily unavailable, please try again'
+            }), 503
         
         # Update CV with task ID
         cv.task_id = task.id
         cv.status = CVStatus.PROCESSING
         db.session.commit()
-        
-        # Use generation for free users
-        current_user.use_generation()
+        cv_service.invalidate_user_statistics(current_user.id)
         
         logger.info(f'Started CV generation for user {current_user.id}, CV {cv.id}')
         
@@ -170,7 +212,7 @@ def get_cv(cv_uuid):
             return jsonify({'error': 'Invalid CV UUID'}), 400
         
         # Get CV
-        cv = CV.query.filter_by(uuid=cv_uuid, user_id=current_user.id).first()
+        cv = cv_service.get_cv_by_uuid(cv_uuid, current_user.id)
         
         if not cv:
             return jsonify({
@@ -231,7 +273,7 @@ def update_cv(cv_uuid):
             return jsonify(format_validation_errors(e.messages)), 400
         
         # Get CV
-        cv = CV.query.filter_by(uuid=cv_uuid, user_id=current_user.id).first()
+        cv = cv_service.get_cv_by_uuid(cv_uuid, current_user.id)
         
         if not cv:
             return jsonify({
@@ -256,7 +298,7 @@ def update_cv(cv_uuid):
         if needs_regeneration:
             # Update data and start regeneration task
             if 'user_data' in update_data:
-                cv.user_data = str(update_data['user_data'])
+                cv.user_data = json.dumps(update_data['user_data'], ensure_ascii=False)
             if 'job_description' in update_data:
                 cv.job_description = update_data['job_description']
             
@@ -280,6 +322,7 @@ def update_cv(cv_uuid):
         
         cv.updated_at = datetime.now(timezone.utc)
         db.session.commit()
+        cv_service.invalidate_user_statistics(current_user.id)
         
         return jsonify({
             'message': message,
@@ -309,7 +352,7 @@ def delete_cv(cv_uuid):
             return jsonify({'error': 'Invalid CV UUID'}), 400
         
         # Get CV
-        cv = CV.query.filter_by(uuid=cv_uuid, user_id=current_user.id).first()
+        cv = cv_service.get_cv_by_uuid(cv_uuid, current_user.id)
         
         if not cv:
             return jsonify({
@@ -317,14 +360,17 @@ def delete_cv(cv_uuid):
                 'message': 'CV not found or you do not have permission to delete it'
             }), 404
         
-        # Delete associated files
-        cv_service.delete_cv_files(cv)
+        cv_id, file_paths = cv.id, (cv.pdf_path, cv.jpg_path)
         
         # Delete CV record
         db.session.delete(cv)
         db.session.commit()
+        cv_service.invalidate_user_statistics(current_user.id)
         
-        logger.info(f'Deleted CV {cv.id} for user {current_user.id}')
+        # Delete associated files, only once the row is really gone
+        cv_service.schedule_cv_file_deletion([file_paths])
+        
+        logger.info(f'Deleted CV {cv_id} for user {current_user.id}')
         
         return jsonify({
             'message': 'CV deleted successfully'
@@ -351,8 +397,8 @@ def get_cv_status(cv_uuid):
         except ValidationError as e:
             return jsonify({'error': 'Invalid CV UUID'}), 400
         
-        # Get CV
-        cv = CV.query.filter_by(uuid=cv_uuid, user_id=current_user.id).first()
+        # Get only the columns the status response needs
+        cv = cv_service.get_cv_fields_by_uuid(cv_uuid, STATUS_COLUMNS, current_user.id)
         
         if not cv:
             return jsonify({
@@ -387,6 +433,94 @@ def get_cv_status(cv_uuid):
         }), 500
 
 
+@cvs_bp.route('/<cv_uuid>/status/stream', methods=['GET'])
+@jwt_required
+def stream_cv_status(cv_uuid):
+    """
+    Stream CV status changes as server-sent events.
+    
+    Emits one event when the CV reaches a final status (or immediately if
+    it already has), then closes. Clients that cannot consume SSE should
+    keep polling the /status endpoint.
+    """
+    try:
+        current_user = request.current_user
+        
+        # Validate UUID format
+        try:
+            validate_cv_uuid(cv_uuid)
+        except ValidationError as e:
+            return jsonify({'error': 'Invalid CV UUID'}), 400
+        
+        cv = cv_service.get_cv_fields_by_uuid(
+            cv_uuid, ['status', 'task_id', 'error_message'], current_user.id
+        )
+        
+        if not cv:
+            return jsonify({
+                'error': 'CV not found',
+                'message': 'CV not found or you do not have permission to access it'
+            }), 404
+        
+        timeout = current_app.config.get('TASK_STREAM_TIMEOUT', 120)
+        
+        def _event(data):
+            return f'data: {json.dumps(data)}\n\n'
+        
+        def generate():
+            if cv.status in TERMINAL_STATUSES or not cv.task_id:
+                yield _event({
+                    'cv_id': cv_uuid,
+                    'status': cv.status.value,
+                    'error_message': cv.error_message
+                })
+                return
+            
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(task_channel(cv.task_id))
+            try:
+                # The task may have finished before the subscription was live
+                latest = cv_service.get_cv_fields_by_uuid(
+                    cv_uuid, ['status', 'error_message'], current_user.id
+                )
+                if latest and latest.status in TERMINAL_STATUSES:
+                    yield _event({
+                        'cv_id': cv_uuid,
+                        'status': latest.status.value,
+                        'error_message': latest.error_message
+                    })
+                    return
+                
+                deadline = time.monotonic() + timeout
+                while time.monotonic() < deadline:
+                    message = pubsub.get_message(timeout=15)
+                    if message is None:
+                        # Keep intermediaries from closing an idle stream
+                        yield ': keep-alive\n\n'
+                        continue
+                    
+                    data = message['data']
+                    yield f'data: {data.decode() if isinstance(data, bytes) else data}\n\n'
+                    return
+                
+                yield _event({'cv_id': cv_uuid, 'status': 'timeout'})
+            finally:
+                pubsub.close()
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        
+    except Exception as e:
+        logger.error(f'Stream CV status error: {str(e)}')
+        return jsonify({
+            'error': 'Failed to stream CV status',
+            'message': 'An error occurred while streaming CV status'
+        }), 500
+
+
 @cvs_bp.route('/<cv_uuid>/download', methods=['GET'])
 @jwt_required
 def download_cv(cv_uuid):
@@ -416,7 +550,7 @@ def download_cv(cv_uuid):
             }), 400
         
         # Get CV
-        cv = CV.query.filter_by(uuid=cv_uuid, user_id=current_user.id).first()
+        cv = cv_service.get_cv_by_uuid(cv_uuid, current_user.id)
         
         if not cv:
             return jsonify({
@@ -490,7 +624,7 @@ def generate_download_token(cv_uuid):
             }), 400
         
         # Get CV
-        cv = CV.query.filter_by(uuid=cv_uuid, user_id=current_user.id).first()
+        cv = cv_service.get_cv_by_uuid(cv_uuid, current_user.id)
         
         if not cv:
             return jsonify({
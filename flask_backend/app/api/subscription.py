@@ -7,6 +7,7 @@ from app.utils.decorators import jwt_required, validate_json
 from app.utils.validators import SubscriptionCreateSchema, format_validation_errors
 from marshmallow import ValidationError
 import stripe
+import orjson
 import logging
 
 # Create blueprint
@@ -197,11 +198,16 @@ def stripe_webhook():
             logger.warning('Missing Stripe-Signature header')
             return jsonify({'error': 'Missing signature'}), 400
         
-        # Verify webhook signature
+        # Verify the signature (and its timestamp, so captured deliveries
+        # can't be replayed) over the raw body, then parse it with orjson.
+        # The handlers only need a plain dict (queued events are plain dicts
+        # too), so no StripeObject is built
         try:
-            event = stripe.Webhook.construct_event(
-                payload, sig_header, current_app.config['STRIPE_WEBHOOK_SECRET']
+            stripe.WebhookSignature.verify_header(
+                payload.decode('utf-8'), sig_header, current_app.config['STRIPE_WEBHOOK_SECRET'],
+                tolerance=stripe.Webhook.DEFAULT_TOLERANCE
             )
+            event = orjson.loads(payload)
         except ValueError:
             logger.error('Invalid payload in webhook')
             return jsonify({'error': 'Invalid payload'}), 400
@@ -215,22 +221,19 @@ def stripe_webhook():
         
         logger.info(f'Received Stripe webhook: {event_type}')
         
-        if event_type == 'customer.subscription.created':
-            payment_service.handle_subscription_created(event_data)
-        elif event_type == 'customer.subscription.updated':
-            payment_service.handle_subscription_updated(event_data)
-        elif event_type == 'customer.subscription.deleted':
-            payment_service.handle_subscription_cancelled(event_data)
-        elif event_type == 'invoice.payment_succeeded':
-            payment_service.handle_payment_succeeded(event_data)
-        elif event_type == 'invoice.payment_failed':
-            payment_service.handle_payment_failed(event_data)
-        elif event_type == 'customer.created':
-            payment_service.handle_customer_created(event_data)
-        elif event_type == 'customer.updated':
-            payment_service.handle_customer_updated(event_data)
-        else:
-            logger.info(f'Unhandled webhook event type: {event_type}')
+        # Stripe retries deliveries; acknowledge ones already handled
+        if not payment_service.claim_webhook_event(event['id']):
+            logger.info(f"Skipping duplicate webhook {event['id']}")
+            return jsonify({'status': 'success'}), 200
+        
+        # Buffer for batched processing; apply inline if Redis is unavailable
+        if not payment_service.queue_webhook_event(event):
+            try:
+                payment_service.handle_webhook_event(event_type, event_data)
+            except Exception:
+                # Unclaim it, or the redelivery after this 500 is skipped
+                payment_service.release_webhook_event(event['id'])
+                raise
         
         return jsonify({'status': 'success'}), 200
         
@@ -120,7 +120,7 @@ def get_user_statistics():
         # Get recent CVs
         recent_cvs_query = cv_service.list_user_cvs(
             current_user.id, 
-            {'page': 1, 'per_page': 5, 'sort_by': 'created_at', 'sort_order': 'desc'}
+            {'page': 1, 'per_page': 5, 'sort_by': 'created_at', 'sort_order': 'desc', 'fast_page': True}
         )
         
         # Calculate account age
@@ -239,7 +239,7 @@ def get_user_activity():
         # Get recent CVs with more details
         recent_activity_query = cv_service.list_user_cvs(
             current_user.id,
-            {'page': 1, 'per_page': 10, 'sort_by': 'updated_at', 'sort_order': 'desc'}
+            {'page': 1, 'per_page': 10, 'sort_by': 'updated_at', 'sort_order': 'desc', 'fast_page': True}
         )
         
         # Format activity data
@@ -329,7 +329,8 @@ def export_user_data():
         if include_cvs:
             all_cvs_query = cv_service.list_user_cvs(
                 current_user.id,
-                {'page': 1, 'per_page': 1000, 'sort_by': 'created_at', 'sort_order': 'desc'}
+                {'page': 1, 'per_page': 1000, 'sort_by': 'created_at', 'sort_order': 'desc',
+                 'fast_page': True, 'include_sensitive': True}
             )
             export_data['cvs'] = [cv.to_dict(include_sensitive=True) for cv in all_cvs_query['cvs']]
         
@@ -389,18 +390,22 @@ def delete_user_account():
         # Delete all user CVs and files
         all_cvs_query = cv_service.list_user_cvs(
             current_user.id,
-            {'page': 1, 'per_page': 1000}
+            {'page': 1, 'per_page': 1000, 'fast_page': True}
         )
         
-        deleted_cvs = 0
+        file_paths = []
         for cv in all_cvs_query['cvs']:
-            cv_service.delete_cv_files(cv)
+            file_paths.append((cv.pdf_path, cv.jpg_path))
             db.session.delete(cv)
-            deleted_cvs += 1
+        deleted_cvs = len(file_paths)
         
         # Delete user account
         db.session.delete(current_user)
         db.session.commit()
+        cv_service.invalidate_user_statistics(user_id)
+        
+        # Files go only once the rows are really gone
+        cv_service.schedule_cv_file_deletion(file_paths)
         
         logger.warning(f'Deleted user account {user_id} ({user_email}) and {deleted_cvs} CVs. Reason: {data.get("reason", "Not provided")}')
         
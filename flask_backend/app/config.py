@@ -33,13 +33,31 @@ class Config:
     CELERY_TIMEZONE = 'UTC'
     CELERY_ENABLE_UTC = True
     
+    # Redis (pub/sub notifications and caching)
+    REDIS_URL = os.environ.get('REDIS_URL', CELERY_BROKER_URL)
+    # Non-evicting Redis for the webhook queue and dedupe markers
+    DURABLE_REDIS_URL = os.environ.get('DURABLE_REDIS_URL', REDIS_URL)
+    TASK_STREAM_TIMEOUT = int(os.environ.get('TASK_STREAM_TIMEOUT', 120))  # seconds
+    CV_STATS_CACHE_TTL = int(os.environ.get('CV_STATS_CACHE_TTL', 300))  # seconds
+    
     # Stripe Configuration
     STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY')
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
     STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+    STRIPE_PRICES_TTL = int(os.environ.get('STRIPE_PRICES_TTL', 21600))  # seconds
+    # Reuse window for checkout/portal sessions on refresh (0 disables)
+    STRIPE_CHECKOUT_CACHE_TTL = int(os.environ.get('STRIPE_CHECKOUT_CACHE_TTL', 120))  # seconds
+    STRIPE_PORTAL_CACHE_TTL = int(os.environ.get('STRIPE_PORTAL_CACHE_TTL', 60))  # seconds
+    STRIPE_SUBSCRIPTION_CACHE_TTL = int(os.environ.get('STRIPE_SUBSCRIPTION_CACHE_TTL', 300))  # seconds
+    STRIPE_TIMEOUT = int(os.environ.get('STRIPE_TIMEOUT', 10))  # seconds per request
+    STRIPE_MAX_NETWORK_RETRIES = int(os.environ.get('STRIPE_MAX_NETWORK_RETRIES', 2))
     
     # AI Services
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+    GEMINI_CACHE_TTL = int(os.environ.get('GEMINI_CACHE_TTL', 3600))  # seconds
+    # Project quota for GEMINI_MODEL, shared by every worker through Redis
+    GEMINI_RPM = int(os.environ.get('GEMINI_RPM', 1000))  # requests per minute
+    GEMINI_TPM = int(os.environ.get('GEMINI_TPM', 1_000_000))  # input tokens per minute
     
     # File Upload Configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
@@ -79,10 +97,15 @@ class ProductionConfig(Config):
     SESSION_COOKIE_SAMESITE = 'Lax'
     
     # Performance
+    # Pools are per process, so size them for the concurrency inside one
+    # gunicorn worker or Celery child (threads/greenlets), not the whole fleet
+    DB_POOL_CONCURRENCY = int(os.environ.get('DB_POOL_CONCURRENCY', 5))
     SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_size': 10,
-        'pool_recycle': 120,
-        'pool_pre_ping': True
+        'pool_size': DB_POOL_CONCURRENCY * 2,
+        'max_overflow': DB_POOL_CONCURRENCY,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+        'pool_use_lifo': True  # Reuse the warmest connections first
     }
     
     # Update CORS for production domains
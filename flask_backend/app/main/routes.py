@@ -76,6 +76,7 @@ def api_documentation():
                 'PUT /cvs/{uuid}': 'Edit CV',
                 'DELETE /cvs/{uuid}': 'Delete CV',
                 'GET /cvs/{uuid}/status': 'Get generation status',
+                'GET /cvs/{uuid}/status/stream': 'Stream completion status (SSE)',
                 'GET /cvs/{uuid}/download': 'Download CV file'
             },
             'subscription': {
@@ -1,5 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import update
+from sqlalchemy.orm import deferred
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from datetime import datetime, timezone
 import uuid
 import enum
@@ -38,8 +41,8 @@ class User(UserMixin, db.Model):
     # Subscription fields
     user_tier = db.Column(db.Enum(UserTier), default=UserTier.FREE, nullable=False)
     generations_left = db.Column(db.Integer, default=2)
-    stripe_customer_id = db.Column(db.String(100), nullable=True, index=True)
-    subscription_id = db.Column(db.String(100), nullable=True)
+    stripe_customer_id = db.Column(db.String(100), nullable=True, index=True, unique=True)
+    subscription_id = db.Column(db.String(100), nullable=True, index=True)
     subscription_status = db.Column(db.String(50), nullable=True)
     subscription_current_period_end = db.Column(db.DateTime(timezone=True), nullable=True)
     
@@ -71,17 +74,50 @@ class User(UserMixin, db.Model):
             'last_login': self.last_login.isoformat() if self.last_login else None
         }
     
+    @property
+    def has_unlimited_generations(self):
+        """Pro and Enterprise have unlimited generations; the tier is the flag."""
+        return self.user_tier != UserTier.FREE
+    
     def can_generate_cv(self):
         """Check if user can generate a new CV."""
-        if self.user_tier == UserTier.FREE:
-            return self.generations_left > 0
-        return True  # Pro and Enterprise have unlimited generations
+        if self.has_unlimited_generations:
+            return True
+        return self.generations_left > 0
     
     def use_generation(self):
-        """Decrement generation count for free users."""
-        if self.user_tier == UserTier.FREE and self.generations_left > 0:
-            self.generations_left -= 1
-            db.session.commit()
+        """
+        Take one generation for free users, as part of the caller's transaction.
+        
+        The decrement is a single conditional UPDATE, so concurrent requests
+        can't both spend the last generation. Not committed here.
+        
+        Returns:
+            bool: False if no generations were left
+        """
+        if self.has_unlimited_generations:
+            return True  # Nothing to count, so nothing to write
+        
+        left = db.session.execute(
+            update(User)
+            .where(User.id == self.id, User.generations_left > 0)
+            .values(generations_left=User.generations_left - 1)
+            .returning(User.generations_left)
+        ).scalar_one_or_none()
+        return left is not None
+    
+    def refund_generation(self):
+        """
+        Give back a generation taken by use_generation. Not committed here.
+        """
+        if self.has_unlimited_generations:
+            return
+        
+        db.session.execute(
+            update(User)
+            .where(User.id == self.id)
+            .values(generations_left=User.generations_left + 1)
+        )
 
 
 class CV(db.Model):
@@ -120,6 +156,12 @@ class CV(db.Model):
                           onupdate=lambda: datetime.now(timezone.utc))
     last_downloaded = db.Column(db.DateTime(timezone=True), nullable=True)
     
+    # Full-text search document over title, user_data and job_description.
+    # Maintained by a database trigger on PostgreSQL; unused elsewhere.
+    search_vector = deferred(db.Column(
+        db.Text().with_variant(TSVECTOR(), 'postgresql'), nullable=True
+    ))
+    
     def __repr__(self):
         return f'<CV {self.uuid}>'
     
@@ -200,6 +242,13 @@ db.Index('idx_cv_user_id', CV.user_id)
 db.Index('idx_cv_uuid', CV.uuid)
 db.Index('idx_cv_status', CV.status)
 db.Index('idx_cv_task_id', CV.task_id)
+# Composite indexes for the per-user list, filter and statistics queries
+db.Index('idx_cv_user_created', CV.user_id, CV.created_at)
+db.Index('idx_cv_user_status', CV.user_id, CV.status)
+db.Index('idx_cv_user_template', CV.user_id, CV.template_name)
+# Trigram GIN indexes backing the ILIKE searches and the GIN index on
+# search_vector are PostgreSQL-only and are created in migrations
+# 5b7d2e9c4a1f and 8e1f4c6a9d3b rather than declared here
 db.Index('idx_token_blacklist_jti', TokenBlacklist.jti)
 db.Index('idx_token_blacklist_user', TokenBlacklist.user_id)
 db.Index('idx_download_token', DownloadToken.token)
@@ -1,16 +1,77 @@
 import jwt
+from jwt.utils import force_bytes
 import uuid
 from datetime import datetime, timezone, timedelta
 from flask import current_app
+from sqlalchemy import delete, select
 from app.models import db, User, TokenBlacklist
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Claim orders for issued tokens; payloads are built positionally from these
+_ACCESS_KEYS = ('user_id', 'email', 'user_tier', 'jti', 'type', 'iat', 'exp')
+_REFRESH_KEYS = ('user_id', 'jti', 'type', 'iat', 'exp')
+
+
+def _make_access_payload(user, now):
+    """Build an access token payload for a user."""
+    return dict(zip(_ACCESS_KEYS, (
+        user.id,
+        user.email,
+        user.user_tier.value,
+        str(uuid.uuid4()),
+        'access',
+        now,
+        now + current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+    )))
+
+
+def _make_refresh_payload(user, now):
+    """Build a refresh token payload for a user."""
+    return dict(zip(_REFRESH_KEYS, (
+        user.id,
+        str(uuid.uuid4()),
+        'refresh',
+        now,
+        now + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+    )))
+
 
 class AuthService:
     """Service for handling authentication, JWT tokens, and user management."""
     
+    def __init__(self):
+        # Signing settings are resolved lazily since services may be
+        # constructed before an application context exists
+        self._jwt_settings = None
+    
+    def _get_jwt_settings(self):
+        """
+        Resolve the JWT signing key and algorithm once per service instance.
+        
+        Returns:
+            tuple: (key_bytes, algorithm, algorithms_list)
+        """
+        if self._jwt_settings is None:
+            algorithm = current_app.config['JWT_ALGORITHM']
+            self._jwt_settings = (
+                force_bytes(current_app.config['JWT_SECRET_KEY']),
+                algorithm,
+                [algorithm]
+            )
+        return self._jwt_settings
+    
+    def _encode(self, payload):
+        """Encode a payload with the cached signing settings."""
+        key, algorithm, _ = self._get_jwt_settings()
+        return jwt.encode(payload, key, algorithm=algorithm)
+    
+    def _decode(self, token):
+        """Decode and verify a token with the cached signing settings."""
+        key, _, algorithms = self._get_jwt_settings()
+        return jwt.decode(token, key, algorithms=algorithms)
+    
     def generate_tokens(self, user):
         """
         Generate access and refresh JWT tokens for a user.
@@ -23,42 +84,13 @@ class AuthService:
         """
         now = datetime.now(timezone.utc)
         
-        # Generate unique JTIs
-        access_jti = str(uuid.uuid4())
-        refresh_jti = str(uuid.uuid4())
-        
-        # Access token payload
-        access_payload = {
-            'user_id': user.id,
-            'email': user.email,
-            'user_tier': user.user_tier.value,
-            'jti': access_jti,
-            'type': 'access',
-            'iat': now,
-            'exp': now + current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
-        }
-        
-        # Refresh token payload
-        refresh_payload = {
-            'user_id': user.id,
-            'jti': refresh_jti,
-            'type': 'refresh',
-            'iat': now,
-            'exp': now + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
-        }
+        # Build payloads (each carries its own unique JTI)
+        access_payload = _make_access_payload(user, now)
+        refresh_payload = _make_refresh_payload(user, now)
         
         # Encode tokens
-        access_token = jwt.encode(
-            access_payload,
-            current_app.config['JWT_SECRET_KEY'],
-            algorithm=current_app.config['JWT_ALGORITHM']
-        )
-        
-        refresh_token = jwt.encode(
-            refresh_payload,
-            current_app.config['JWT_SECRET_KEY'],
-            algorithm=current_app.config['JWT_ALGORITHM']
-        )
+        access_token = self._encode(access_payload)
+        refresh_token = self._encode(refresh_payload)
         
         logger.info(f'Generated tokens for user {user.id}')
         
@@ -75,11 +107,7 @@ class AuthService:
             dict: Token payload if valid, None if invalid
         """
         try:
-            payload = jwt.decode(
-                token,
-                current_app.config['JWT_SECRET_KEY'],
-                algorithms=[current_app.config['JWT_ALGORITHM']]
-            )
+            payload = self._decode(token)
             
             # Check if token is blacklisted
             if self.is_token_blacklisted(payload.get('jti')):
@@ -124,24 +152,9 @@ class AuthService:
                 return {'success': False, 'message': 'User not found'}
             
             # Generate new access token
-            now = datetime.now(timezone.utc)
-            access_jti = str(uuid.uuid4())
-            
-            access_payload = {
-                'user_id': user.id,
-                'email': user.email,
-                'user_tier': user.user_tier.value,
-                'jti': access_jti,
-                'type': 'access',
-                'iat': now,
-                'exp': now + current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
-            }
-            
-            access_token = jwt.encode(
-                access_payload,
-                current_app.config['JWT_SECRET_KEY'],
-                algorithm=current_app.config['JWT_ALGORITHM']
-            )
+            access_payload = _make_access_payload(user, datetime.now(timezone.utc))
+            
+            access_token = self._encode(access_payload)
             
             logger.info(f'Refreshed access token for user {user.id}')
             
@@ -250,6 +263,9 @@ class AuthService:
         """
         Validate token and return user if valid.
         
+        Runs on every authenticated request, so the user and the token's
+        blacklist entry are fetched in a single query.
+        
         Args:
             token (str): JWT token string
             required_type (str): Required token type ('access' or 'refresh')
@@ -258,10 +274,14 @@ class AuthService:
             tuple: (user, payload) if valid, (None, None) if invalid
         """
         try:
-            # Decode token
-            payload = self.decode_token(token)
-            
-            if not payload:
+            # Verify signature and expiry
+            try:
+                payload = self._decode(token)
+            except jwt.ExpiredSignatureError:
+                logger.info('Token has expired')
+                return None, None
+            except jwt.InvalidTokenError as e:
+                logger.warning(f'Invalid token: {str(e)}')
                 return None, None
             
             # Check token type
@@ -269,12 +289,27 @@ class AuthService:
                 logger.warning(f'Invalid token type: expected {required_type}, got {payload.get("type")}')
                 return None, None
             
-            # Get user
-            user = User.query.get(payload.get('user_id'))
-            if not user:
+            jti = payload.get('jti')
+            if not jti:
+                logger.warning('Token missing jti')
+                return None, None
+            
+            # Get user and blacklist status together
+            row = db.session.execute(
+                select(
+                    User,
+                    select(TokenBlacklist.id).where(TokenBlacklist.jti == jti).exists()
+                ).where(User.id == payload.get('user_id'))
+            ).one_or_none()
+            if not row:
                 logger.warning(f'User not found for token: {payload.get("user_id")}')
                 return None, None
             
+            user, blacklisted = row
+            if blacklisted:
+                logger.warning("Attempted use of blacklisted token")
+                return None, None
+            
             # Additional validation: check if token was issued before user's last update
             # This helps with the "revoke all tokens" functionality
             token_issued_at = datetime.fromtimestamp(payload.get('iat'), timezone.utc)
@@ -294,15 +329,12 @@ class AuthService:
         This should be run periodically as a maintenance task.
         """
         try:
+            # One DELETE; the expired rows are never loaded
             now = datetime.now(timezone.utc)
-            expired_tokens = TokenBlacklist.query.filter(
-                TokenBlacklist.expires_at < now
-            ).all()
-            
-            count = len(expired_tokens)
-            
-            for token in expired_tokens:
-                db.session.delete(token)
+            result = db.session.execute(
+                delete(TokenBlacklist).where(TokenBlacklist.expires_at < now)
+            )
+            count = result.rowcount
             
             db.session.commit()
             
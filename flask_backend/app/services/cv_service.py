@@ -2,14 +2,57 @@ import os
 import json
 import logging
 from datetime import datetime, timezone
-from flask import current_app
-from sqlalchemy import desc, asc, or_
+from flask import current_app, g
+from celery import states, group
+from sqlalchemy import (
+    desc, asc, or_, func, case, delete, update, tuple_, literal, select, bindparam
+)
+from sqlalchemy.orm import defer
 from app.models import db, CV, CVStatus, User
 from app import celery
+from app.utils.redis_client import (
+    publish_task_event, cache_get_json, cache_set_json, cache_delete
+)
 import shutil
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of UUIDs bound into a single IN (...) lookup
+ORPHAN_LOOKUP_BATCH_SIZE = 1000
+
+# Statuses after which a CV's task will not change again
+TERMINAL_STATUSES = frozenset([CVStatus.SUCCESS, CVStatus.FAILED])
+
+# Status filter values accepted from query parameters
+_STATUS_BY_VALUE = {status.value: status for status in CVStatus}
+
+# Columns list_user_cvs may sort by; anything else falls back to created_at
+_SORTABLE_COLUMNS = {
+    'created_at': CV.created_at,
+    'updated_at': CV.updated_at,
+    'title': CV.title,
+    'status': CV.status
+}
+
+# Large TEXT columns that plain listings never read (see CV.to_dict)
+LIST_DEFERRED_COLUMNS = (
+    defer(CV.user_data),
+    defer(CV.job_description),
+    defer(CV.latex_code)
+)
+
+def _stats_cache_key(user_id):
+    """Cache key for a user's CV statistics."""
+    return f'cvstats:{user_id}'
+
+
+# Prebuilt statements for the per-request CV lookup by UUID
+_cv_by_uuid_stmt = select(CV).where(CV.uuid == bindparam('cv_uuid'))
+_cv_by_uuid_user_stmt = select(CV).where(
+    CV.uuid == bindparam('cv_uuid'),
+    CV.user_id == bindparam('user_id')
+)
+
 
 class CVService:
     """Service for CV management and operations."""
@@ -20,7 +63,9 @@ class CVService:
         
         Args:
             user_id (int): User ID
-            query_params (dict): Query parameters from request
+            query_params (dict): Query parameters from request; set
+                include_sensitive to also load user_data, job_description
+                and latex_code
             
         Returns:
             dict: Paginated CV results
@@ -29,41 +74,74 @@ class CVService:
             # Base query
             query = CV.query.filter_by(user_id=user_id)
             
+            # Listings only need metadata; skip the large TEXT columns unless
+            # the caller will serialize them
+            if not query_params.get('include_sensitive'):
+                query = query.options(*LIST_DEFERRED_COLUMNS)
+            
             # Apply filters
-            if query_params.get('status'):
-                try:
-                    status = CVStatus(query_params['status'])
-                    query = query.filter_by(status=status)
-                except ValueError:
-                    pass  # Invalid status, ignore filter
+            status = _STATUS_BY_VALUE.get(query_params.get('status'))
+            if status:
+                query = query.filter_by(status=status)  # Invalid status is ignored
             
             if query_params.get('template_name'):
                 query = query.filter_by(template_name=query_params['template_name'])
             
             if query_params.get('search'):
-                search_term = f"%{query_params['search']}%"
-                query = query.filter(
-                    or_(
-                        CV.title.ilike(search_term),
-                        CV.user_data.ilike(search_term),
-                        CV.job_description.ilike(search_term)
-                    )
-                )
+                query = query.filter(self._search_filter(query_params['search']))
             
-            # Apply sorting
-            sort_by = query_params.get('sort_by', 'created_at')
+            # Apply sorting (id breaks ties so cursors are stable)
+            sort_column = _SORTABLE_COLUMNS.get(query_params.get('sort_by'), CV.created_at)
             sort_order = query_params.get('sort_order', 'desc')
-            
-            if hasattr(CV, sort_by):
-                sort_column = getattr(CV, sort_by)
-                if sort_order == 'asc':
-                    query = query.order_by(asc(sort_column))
-                else:
-                    query = query.order_by(desc(sort_column))
+            order = asc if sort_order == 'asc' else desc
+            query = query.order_by(order(sort_column), order(CV.id))
             
             # Apply pagination
             page = query_params.get('page', 1)
             per_page = query_params.get('per_page', 10)
+            keyset = sort_column is CV.created_at
+            
+            after_created_at = query_params.get('after_created_at')
+            after_id = query_params.get('after_id')
+            
+            if keyset and after_created_at is not None and after_id is not None:
+                # Seek past the cursor on (created_at, id) instead of OFFSET,
+                # so deep pages cost the same as the first one
+                row = tuple_(CV.created_at, CV.id)
+                cursor = tuple_(literal(after_created_at), literal(after_id))
+                query = query.filter(row > cursor if sort_order == 'asc' else row < cursor)
+                
+                items = query.limit(per_page + 1).all()
+                has_next = len(items) > per_page
+                items = items[:per_page]
+                
+                return {
+                    'cvs': items,
+                    'page': None,
+                    'per_page': per_page,
+                    'total': None,
+                    'pages': None,
+                    'has_next': has_next,
+                    'has_prev': True,
+                    'next_cursor': self._next_cursor(items) if has_next else None
+                }
+            
+            if query_params.get('fast_page') and not query_params.get('include_total'):
+                # Skip the COUNT(*) and detect a next page by over-fetching one row
+                items = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+                has_next = len(items) > per_page
+                items = items[:per_page]
+                
+                return {
+                    'cvs': items,
+                    'page': page,
+                    'per_page': per_page,
+                    'total': None,
+                    'pages': None,
+                    'has_next': has_next,
+                    'has_prev': page > 1,
+                    'next_cursor': self._next_cursor(items) if keyset and has_next else None
+                }
             
             pagination = query.paginate(
                 page=page,
@@ -78,13 +156,80 @@ class CVService:
                 'total': pagination.total,
                 'pages': pagination.pages,
                 'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
+                'has_prev': pagination.has_prev,
+                'next_cursor': (
+                    self._next_cursor(pagination.items)
+                    if keyset and pagination.has_next else None
+                )
             }
             
         except Exception as e:
             logger.error(f'List user CVs error: {str(e)}')
             raise e
     
+    def _search_filter(self, search):
+        """
+        Build the listing search condition for the active database.
+        
+        PostgreSQL matches against the GIN-indexed search_vector; other
+        backends fall back to substring matching.
+        
+        Args:
+            search (str): Search text
+            
+        Returns:
+            ColumnElement: Filter condition
+        """
+        if db.session.get_bind().dialect.name == 'postgresql':
+            return CV.search_vector.op('@@')(func.plainto_tsquery('english', search))
+        
+        search_term = f"%{search}%"
+        return or_(
+            CV.title.ilike(search_term),
+            CV.user_data.ilike(search_term),
+            CV.job_description.ilike(search_term)
+        )
+    
+    def _next_cursor(self, items):
+        """
+        Build the keyset cursor that continues after the last listed CV.
+        
+        Args:
+            items (list): CVs on the current page, in listing order
+            
+        Returns:
+            dict: Cursor parameters for the next page or None
+        """
+        if not items:
+            return None
+        
+        last = items[-1]
+        return {
+            'after_created_at': last.created_at.isoformat(),
+            'after_id': last.id
+        }
+    
+    def get_cv_by_id(self, cv_id):
+        """
+        Get CV by primary key, remembered for the current app context.
+        
+        Each Celery task runs in its own app context, so repeated lookups
+        inside one task reuse the first load.
+        
+        Args:
+            cv_id (int): CV database ID
+            
+        Returns:
+            CV: CV object or None if not found
+        """
+        cache = g.setdefault('cv_cache', {})
+        cv = cache.get(cv_id)
+        if cv is None:
+            cv = db.session.get(CV, cv_id)
+            if cv is not None:
+                cache[cv_id] = cv
+        return cv
+    
     def get_cv_by_uuid(self, cv_uuid, user_id=None):
         """
         Get CV by UUID with optional user verification.
@@ -97,51 +242,94 @@ class CVService:
             CV: CV object or None if not found
         """
         try:
-            query = CV.query.filter_by(uuid=cv_uuid)
-            
             if user_id:
-                query = query.filter_by(user_id=user_id)
+                return db.session.execute(
+                    _cv_by_uuid_user_stmt, {'cv_uuid': cv_uuid, 'user_id': user_id}
+                ).scalar_one_or_none()
             
-            return query.first()
+            return db.session.execute(
+                _cv_by_uuid_stmt, {'cv_uuid': cv_uuid}
+            ).scalar_one_or_none()
             
         except Exception as e:
             logger.error(f'Get CV by UUID error: {str(e)}')
             return None
     
-    def delete_cv_files(self, cv):
+    def get_cv_fields_by_uuid(self, cv_uuid, columns, user_id=None):
         """
-        Delete CV-related files from filesystem.
+        Get selected CV columns by UUID without loading the full CV.
         
         Args:
-            cv (CV): CV object
+            cv_uuid (str): CV UUID
+            columns (list): CV column names to select
+            user_id (int, optional): User ID for ownership verification
+            
+        Returns:
+            Row: Row with the requested columns or None if not found
         """
         try:
-            files_to_delete = []
+            stmt = select(*[getattr(CV, column) for column in columns]).where(
+                CV.uuid == cv_uuid
+            )
             
-            if cv.pdf_path and os.path.exists(cv.pdf_path):
-                files_to_delete.append(cv.pdf_path)
+            if user_id:
+                stmt = stmt.where(CV.user_id == user_id)
             
-            if cv.jpg_path and os.path.exists(cv.jpg_path):
-                files_to_delete.append(cv.jpg_path)
-            
-            # Delete the entire CV directory if it exists
-            cv_dir = os.path.dirname(cv.pdf_path) if cv.pdf_path else None
-            if cv_dir and os.path.exists(cv_dir):
-                try:
-                    shutil.rmtree(cv_dir)
-                    logger.info(f'Deleted CV directory: {cv_dir}')
-                except Exception as e:
-                    logger.warning(f'Failed to delete CV directory {cv_dir}: {str(e)}')
-                    # Fall back to individual file deletion
-                    for file_path in files_to_delete:
-                        try:
-                            os.remove(file_path)
-                            logger.info(f'Deleted file: {file_path}')
-                        except Exception as fe:
-                            logger.warning(f'Failed to delete file {file_path}: {str(fe)}')
+            return db.session.execute(stmt).one_or_none()
             
         except Exception as e:
-            logger.error(f'Delete CV files error: {str(e)}')
+            logger.error(f'Get CV fields by UUID error: {str(e)}')
+            return None
+    
+    def delete_cv_files(self, cv):
+        """
+        Schedule deletion of CV-related files from filesystem.
+        
+        Args:
+            cv (CV): CV object
+        """
+        self.schedule_cv_file_deletion([(cv.pdf_path, cv.jpg_path)])
+    
+    def schedule_cv_file_deletion(self, paths):
+        """
+        Delete CV files on the Celery workers instead of in the request.
+        
+        Falls back to deleting inline if the tasks cannot be enqueued.
+        
+        Args:
+            paths (list): (pdf_path, jpg_path) tuples for the deleted CVs
+        """
+        paths = [(pdf_path, jpg_path) for pdf_path, jpg_path in paths if pdf_path or jpg_path]
+        if not paths:
+            return
+        
+        try:
+            group(
+                celery.signature('delete_cv_files_task', args=(pdf_path, jpg_path))
+                for pdf_path, jpg_path in paths
+            ).apply_async()
+        except Exception as e:
+            logger.warning(f'Failed to enqueue CV file deletion, deleting inline: {str(e)}')
+            for pdf_path, jpg_path in paths:
+                self.delete_cv_file_paths(pdf_path, jpg_path)
+    
+    def delete_cv_file_paths(self, pdf_path, jpg_path):
+        """
+        Delete CV files given their stored paths.
+        
+        Args:
+            pdf_path (str): Stored PDF path (may be None)
+            jpg_path (str): Stored JPG path (may be None)
+        """
+        # Both files live in the CV's own directory, so removing it covers
+        # them; a missing directory is not an error
+        file_path = pdf_path or jpg_path
+        if not file_path:
+            return
+        
+        cv_dir = os.path.dirname(file_path)
+        shutil.rmtree(cv_dir, ignore_errors=True)
+        logger.info(f'Deleted CV directory: {cv_dir}')
     
     def get_task_status(self, task_id):
         """
@@ -157,29 +345,37 @@ class CVService:
             if not task_id:
                 return None
             
-            # Get task result from Celery
-            task_result = celery.AsyncResult(task_id)
+            # Multiple handlers in one request share a single lookup
+            cache = g.setdefault('task_status_cache', {})
+            if task_id in cache:
+                return cache[task_id]
+            
+            # Fetch the task meta from the result backend once and derive
+            # every flag from it instead of re-reading per AsyncResult call
+            meta = celery.backend.get_task_meta(task_id)
+            state = meta['status']
             
             status_info = {
                 'task_id': task_id,
-                'state': task_result.state,
-                'ready': task_result.ready(),
-                'successful': task_result.successful(),
-                'failed': task_result.failed()
+                'state': state,
+                'ready': state in states.READY_STATES,
+                'successful': state == states.SUCCESS,
+                'failed': state == states.FAILURE
             }
             
             # Add additional info based on state
-            if task_result.state == 'PENDING':
+            if state == states.PENDING:
                 status_info['message'] = 'Task is waiting to be processed'
-            elif task_result.state == 'PROGRESS':
+            elif state == 'PROGRESS':
                 # Get progress info if available
-                if hasattr(task_result, 'info') and task_result.info:
-                    status_info.update(task_result.info)
-            elif task_result.state == 'SUCCESS':
-                status_info['result'] = task_result.result
-            elif task_result.state == 'FAILURE':
-                status_info['error'] = str(task_result.info)
-            
+                if isinstance(meta.get('result'), dict):
+                    status_info.update(meta['result'])
+            elif state == states.SUCCESS:
+                status_info['result'] = meta.get('result')
+            elif state == states.FAILURE:
+                status_info['error'] = str(meta.get('result'))
+            
+            cache[task_id] = status_info
             return status_info
             
         except Exception as e:
@@ -206,35 +402,55 @@ class CVService:
             generation_time (float, optional): Generation time in seconds
         """
         try:
-            cv = CV.query.get(cv_id)
-            if not cv:
-                logger.error(f'CV not found: {cv_id}')
-                return False
-            
-            # Update status
-            cv.status = status
-            cv.updated_at = datetime.now(timezone.utc)
+            # Only the provided columns are written; the row is never loaded
+            values = {
+                'status': status,
+                'updated_at': datetime.now(timezone.utc)
+            }
             
             # Update optional fields
             if error_message is not None:
-                cv.error_message = error_message
+                values['error_message'] = error_message
             
             if latex_code is not None:
-                cv.latex_code = latex_code
+                values['latex_code'] = latex_code
             
             if pdf_path is not None:
-                cv.pdf_path = pdf_path
-                # Get file size if file exists
-                if os.path.exists(pdf_path):
-                    cv.pdf_size = os.path.getsize(pdf_path)
+                values['pdf_path'] = pdf_path
+                # Get file size if file exists (single stat call)
+                try:
+                    values['pdf_size'] = os.stat(pdf_path).st_size
+                except FileNotFoundError:
+                    pass
             
             if jpg_path is not None:
-                cv.jpg_path = jpg_path
+                values['jpg_path'] = jpg_path
             
             if generation_time is not None:
-                cv.generation_time = generation_time
+                values['generation_time'] = generation_time
+            
+            row = db.session.execute(
+                update(CV)
+                .where(CV.id == cv_id)
+                .values(**values)
+                .returning(CV.user_id, CV.task_id, CV.uuid, CV.error_message)
+            ).one_or_none()
+            
+            if row is None:
+                db.session.rollback()
+                logger.error(f'CV not found: {cv_id}')
+                return False
             
             db.session.commit()
+            self.invalidate_user_statistics(row.user_id)
+            
+            # Wake any status streams waiting on this task
+            if status in TERMINAL_STATUSES:
+                publish_task_event(row.task_id, {
+                    'cv_id': row.uuid,
+                    'status': status.value,
+                    'error_message': row.error_message
+                })
             
             logger.info(f'Updated CV {cv_id} status to {status.value}')
             return True
@@ -254,44 +470,43 @@ class CVService:
         Returns:
             dict: CV statistics
         """
+        cache_key = _stats_cache_key(user_id)
+        cached = cache_get_json(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            total_cvs = CV.query.filter_by(user_id=user_id).count()
-            
-            successful_cvs = CV.query.filter_by(
-                user_id=user_id, 
-                status=CVStatus.SUCCESS
-            ).count()
-            
-            failed_cvs = CV.query.filter_by(
-                user_id=user_id, 
-                status=CVStatus.FAILED
-            ).count()
-            
-            processing_cvs = CV.query.filter(
-                CV.user_id == user_id,
-                CV.status.in_([CVStatus.PENDING, CVStatus.PROCESSING])
-            ).count()
+            # Status counts and average generation time in one pass
+            totals = db.session.execute(
+                select(
+                    func.count(CV.id).label('total'),
+                    func.sum(case((CV.status == CVStatus.SUCCESS, 1), else_=0)).label('successful'),
+                    func.sum(case((CV.status == CVStatus.FAILED, 1), else_=0)).label('failed'),
+                    func.sum(case(
+                        (CV.status.in_([CVStatus.PENDING, CVStatus.PROCESSING]), 1), else_=0
+                    )).label('processing'),
+                    func.avg(CV.generation_time).label('avg_generation_time')
+                ).where(CV.user_id == user_id)
+            ).one()
+            
+            total_cvs = totals.total or 0
+            successful_cvs = totals.successful or 0
+            failed_cvs = totals.failed or 0
+            processing_cvs = totals.processing or 0
+            avg_generation_time = totals.avg_generation_time
             
             # Get most used template
-            from sqlalchemy import func
-            template_stats = db.session.query(
-                CV.template_name,
-                func.count(CV.id).label('count')
-            ).filter_by(user_id=user_id).group_by(CV.template_name).all()
+            template_stats = db.session.execute(
+                select(CV.template_name, func.count(CV.id).label('count'))
+                .where(CV.user_id == user_id)
+                .group_by(CV.template_name)
+            ).all()
             
             most_used_template = None
             if template_stats:
                 most_used_template = max(template_stats, key=lambda x: x.count).template_name
             
-            # Get average generation time
-            avg_generation_time = db.session.query(
-                func.avg(CV.generation_time)
-            ).filter(
-                CV.user_id == user_id,
-                CV.generation_time.isnot(None)
-            ).scalar()
-            
-            return {
+            statistics = {
                 'total_cvs': total_cvs,
                 'successful_cvs': successful_cvs,
                 'failed_cvs': failed_cvs,
@@ -302,6 +517,9 @@ class CVService:
                 'template_usage': {stat.template_name: stat.count for stat in template_stats}
             }
             
+            cache_set_json(cache_key, statistics, current_app.config['CV_STATS_CACHE_TTL'])
+            return statistics
+            
         except Exception as e:
             logger.error(f'Get user CV statistics error: {str(e)}')
             return {
@@ -315,6 +533,15 @@ class CVService:
                 'template_usage': {}
             }
     
+    def invalidate_user_statistics(self, user_id):
+        """
+        Drop a user's cached CV statistics after their CVs change.
+        
+        Args:
+            user_id (int): User ID
+        """
+        cache_delete(_stats_cache_key(user_id))
+    
     def search_cvs(self, user_id, search_query, filters=None, limit=10):
         """
         Search CVs with advanced filtering.
@@ -345,12 +572,9 @@ class CVService:
             
             # Apply additional filters
             if filters:
-                if 'status' in filters:
-                    try:
-                        status = CVStatus(filters['status'])
-                        query = query.filter_by(status=status)
-                    except ValueError:
-                        pass
+                status = _STATUS_BY_VALUE.get(filters.get('status'))
+                if status:
+                    query = query.filter_by(status=status)
                 
                 if 'template_name' in filters:
                     query = query.filter_by(template_name=filters['template_name'])
@@ -385,27 +609,24 @@ class CVService:
             dict: Result with deleted count and any errors
         """
         try:
-            deleted_count = 0
-            errors = []
+            # Delete all owned rows in one statement and keep their file paths
+            rows = db.session.execute(
+                delete(CV)
+                .where(CV.id.in_(cv_ids), CV.user_id == user_id)
+                .returning(CV.id, CV.pdf_path, CV.jpg_path)
+            ).all()
+            db.session.commit()
+            self.invalidate_user_statistics(user_id)
             
-            for cv_id in cv_ids:
-                try:
-                    cv = CV.query.filter_by(id=cv_id, user_id=user_id).first()
-                    
-                    if cv:
-                        # Delete files
-                        self.delete_cv_files(cv)
-                        
-                        # Delete record
-                        db.session.delete(cv)
-                        deleted_count += 1
-                    else:
-                        errors.append(f'CV {cv_id} not found or access denied')
-                        
-                except Exception as e:
-                    errors.append(f'Failed to delete CV {cv_id}: {str(e)}')
+            deleted_count = len(rows)
+            deleted_ids = {row.id for row in rows}
+            errors = [
+                f'CV {cv_id} not found or access denied'
+                for cv_id in cv_ids if cv_id not in deleted_ids
+            ]
             
-            db.session.commit()
+            # Remove files only once the rows are gone
+            self.schedule_cv_file_deletion([(row.pdf_path, row.jpg_path) for row in rows])
             
             logger.info(f'Bulk deleted {deleted_count} CVs for user {user_id}')
             
@@ -437,26 +658,35 @@ class CVService:
             
             cleaned_count = 0
             
-            # Get all CV directories
-            for item in os.listdir(upload_folder):
-                item_path = os.path.join(upload_folder, item)
-                
-                if os.path.isdir(item_path) and item.startswith('cv_'):
-                    # Extract UUID from directory name
-                    try:
-                        cv_uuid = item.replace('cv_', '')
-                        
-                        # Check if CV exists in database
-                        cv = CV.query.filter_by(uuid=cv_uuid).first()
-                        
-                        if not cv:
-                            # Orphaned directory, remove it
-                            shutil.rmtree(item_path)
-                            cleaned_count += 1
-                            logger.info(f'Cleaned up orphaned directory: {item_path}')
-                            
-                    except Exception as e:
-                        logger.warning(f'Error processing directory {item_path}: {str(e)}')
+            # Map candidate UUIDs to their directories in one pass; the name
+            # check is free, and is_dir() reuses the d_type from the listing
+            with os.scandir(upload_folder) as entries:
+                candidates = {
+                    entry.name[3:]: entry.path
+                    for entry in entries
+                    if entry.name.startswith('cv_') and entry.is_dir(follow_symlinks=False)
+                }
+            
+            # Look up which candidates still have a CV record, in batches
+            candidate_uuids = list(candidates)
+            existing = set()
+            for i in range(0, len(candidate_uuids), ORPHAN_LOOKUP_BATCH_SIZE):
+                batch = candidate_uuids[i:i + ORPHAN_LOOKUP_BATCH_SIZE]
+                existing.update(
+                    cv_uuid for (cv_uuid,) in
+                    db.session.query(CV.uuid).filter(CV.uuid.in_(batch))
+                )
+            
+            for cv_uuid in candidates.keys() - existing:
+                item_path = candidates[cv_uuid]
+                try:
+                    # Orphaned directory, remove it
+                    shutil.rmtree(item_path)
+                    cleaned_count += 1
+                    logger.info(f'Cleaned up orphaned directory: {item_path}')
+                    
+                except Exception as e:
+                    logger.warning(f'Error processing directory {item_path}: {str(e)}')
             
             return {
                 'cleaned_count': cleaned_count,
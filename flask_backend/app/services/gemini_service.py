@@ -1,53 +1,115 @@
 from google import genai
 from google.genai import types
+from google.genai import errors as genai_errors
 from pydantic import BaseModel
+import httpx
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+import orjson
+from flask import current_app
+from app.utils.redis_client import cache_get_json, cache_set_json, take_tokens
 import os
+import json
+import asyncio
+import hashlib
 import logging
+import re
+import threading
+import time
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
+# Shared Gemini client so every call reuses one HTTP connection pool
+_client = None
+_client_lock = threading.Lock()
 
-class CVOutput(BaseModel):
-    latex_code: str
+# LaTeX templates shipped with the backend
+TEMPLATE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'latex_templates'
+)
 
+# Per-request Gemini timeout (milliseconds)
+GEMINI_TIMEOUT_MS = 60_000
 
-def generate_cv_with_gemini(user_data, job_description, template_name):
-    """
-    Generate CV LaTeX code using Gemini AI.
-    
-    Args:
-        user_data (dict): User information and details
-        job_description (str): Job description to tailor CV for
-        template_name (str): Template name to use
-        
-    Returns:
-        str: Generated LaTeX code
-    """
-    try:
-        # Configure Gemini
-        api_key = os.environ.get('GEMINI_API_KEY')
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
-        
-        client = genai.Client(api_key=api_key)
-        
-        # Load template
-        template_content = load_template(template_name)
-        
-        # Create comprehensive prompt
-        prompt = f"""
-You are a professional CV writer with expertise in creating compelling resumes that get interviews.
+# Attempts per Gemini call when it hits rate limits or transient errors
+GEMINI_MAX_ATTEMPTS = 3
+
+# Longest a call waits for shared quota before sending anyway (seconds);
+# the 429 retry is still there behind it
+GEMINI_QUOTA_MAX_WAIT = 30
+
+# Rough prompt characters per token, for quota estimates
+CHARS_PER_TOKEN = 4
+
+# Streamed output this long without \documentclass is abandoned
+STREAM_HEAD_CHARS = 256
 
-Create a professional CV based on the following information:
+# Most Gemini calls a single batch keeps in flight
+BATCH_CONCURRENCY = 10
 
-USER INFORMATION:
-{format_user_data(user_data)}
+# \begin{document} as it appears JSON-escaped in streamed output
+_STREAM_PREAMBLE_END = '\\\\begin{document}'
 
-JOB DESCRIPTION TO TAILOR FOR:
-{job_description}
+# Leading characters searched for \documentclass in a finished response
+OUTPUT_HEAD_CHARS = 200
+
+# Fallback LaTeX template used when a named template is unavailable
+_BASIC_TEMPLATE = r"""
+\documentclass[11pt,a4paper,sans]{moderncv}
+\moderncvstyle{classic}
+\moderncvcolor{blue}
+\usepackage[scale=0.75]{geometry}
+\usepackage[utf8]{inputenc}
 
-LATEX TEMPLATE TO CUSTOMIZE:
-{template_content}
+% Personal data
+\name{[NAME]}{\space}
+\title{[TITLE]}
+\address{[ADDRESS]}{\space}{\space}
+\phone[mobile]{[PHONE]}
+\email{[EMAIL]}
+\social[linkedin]{[LINKEDIN]}
+\social[github]{[GITHUB]}
+
+\begin{document}
+\makecvtitle
+
+\section{Professional Summary}
+[SUMMARY]
+
+\section{Experience}
+\cventry{[YEAR]--[YEAR]}{[POSITION]}{[COMPANY]}{[LOCATION]}{}{%
+[DESCRIPTION]
+\begin{itemize}%
+\item [ACHIEVEMENT_1]
+\item [ACHIEVEMENT_2]
+\item [ACHIEVEMENT_3]
+\end{itemize}}
+
+\section{Education}
+\cventry{[YEAR]--[YEAR]}{[DEGREE]}{[INSTITUTION]}{[LOCATION]}{\textit{[GPA]}}{[DESCRIPTION]}
+
+\section{Skills}
+\cvitemwithcomment{Programming}{[PROGRAMMING_SKILLS]}{[LEVEL]}
+\cvitemwithcomment{Technologies}{[TECH_SKILLS]}{[LEVEL]}
+\cvitemwithcomment{Languages}{[LANGUAGES]}{[LEVEL]}
+
+\section{Projects}
+\cventry{[YEAR]}{[PROJECT_NAME]}{[TECH_STACK]}{}{}{%
+[PROJECT_DESCRIPTION]
+\begin{itemize}%
+\item [FEATURE_1]
+\item [FEATURE_2]
+\end{itemize}}
+
+\end{document}
+"""
+
+# Static instructions lead every prompt so Gemini's implicit context cache
+# can reuse them; the per-request data follows
+_GENERATE_PROMPT_PREFIX = """
+You are a professional CV writer with expertise in creating compelling resumes that get interviews.
+
+Create a professional CV from the user information, job description and LaTeX template below.
 
 INSTRUCTIONS:
 1. Customize the CV content to match the job requirements perfectly
@@ -66,42 +128,224 @@ OUTPUT REQUIREMENTS:
 - Ensure all LaTeX syntax is correct
 - No explanations or additional text outside the LaTeX code
 - Make sure all special characters are properly escaped
+"""
+
+_GENERATE_PROMPT_SUFFIX = """
 
 Provide the complete LaTeX code in the latex_code field.
 """
+
+_EDIT_PROMPT_PREFIX = """
+You are a professional CV editor with expertise in improving resumes for better job matching.
+
+TASK:
+Modify the existing LaTeX CV code below according to the editing instructions while:
+
+1. Maintaining the overall structure and formatting
+2. Improving content quality and relevance
+3. Ensuring the CV better matches the job requirements
+4. Keeping all LaTeX syntax valid and compilable
+5. Preserving the professional tone and readability
+6. Making strategic improvements to highlight relevant skills
+7. Optimizing for ATS compatibility
+8. Following the specific editing instructions provided
+
+IMPORTANT:
+- Return only the complete modified LaTeX code
+- Ensure all changes improve the CV's effectiveness
+- Maintain proper LaTeX formatting and syntax
+- Don't remove essential structural elements
+- Keep the CV concise and focused
+"""
+
+_EDIT_PROMPT_SUFFIX = """
+
+Provide the complete edited LaTeX code in the latex_code field.
+"""
+
+# Runs of whitespace collapsed by _normalize_whitespace
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Matches [PLACEHOLDER] tokens in _BASIC_TEMPLATE
+_PLACEHOLDER_RE = re.compile(r'\[([A-Z_0-9]+)\]')
+
+# Job titles recognised by extract_job_title, matched longest first so
+# e.g. "full stack developer" wins over a shorter overlapping title
+_COMMON_TITLES = (
+    'software engineer', 'software developer', 'full stack developer',
+    'frontend developer', 'backend developer', 'data scientist',
+    'product manager', 'project manager', 'marketing manager',
+    'sales representative', 'business analyst', 'ux designer',
+    'ui designer', 'graphic designer', 'content writer',
+    'digital marketer', 'account manager', 'consultant'
+)
+_COMMON_TITLE_RE = re.compile(
+    '(' + '|'.join(re.escape(title) for title in sorted(_COMMON_TITLES, key=len, reverse=True)) + ')',
+    re.IGNORECASE
+)
+_TITLE_WORDS = frozenset(['engineer', 'developer', 'manager', 'analyst', 'designer', 'specialist'])
+
+# user_data sections format_user_data renders, in order, as (key, format)
+_USER_DATA_SECTIONS = (
+    ('name', 'Name: {}'),
+    ('email', 'Email: {}'),
+    ('phone', 'Phone: {}'),
+    ('location', 'Location: {}'),
+    ('linkedin', 'LinkedIn: {}'),
+    ('website', 'Website: {}'),
+    ('summary', '\nProfessional Summary:\n{}'),
+    ('experience', '\nExperience:\n{}'),
+    ('skills', '\nSkills: {}'),
+    ('education', '\nEducation:\n{}'),
+    ('projects', '\nProjects:\n{}'),
+    ('certifications', '\nCertifications:\n{}'),
+    ('languages', '\nLanguages: {}')
+)
+_KNOWN_USER_DATA_KEYS = frozenset(key for key, _ in _USER_DATA_SECTIONS)
+
+
+class CVOutput(BaseModel):
+    latex_code: str
+
+
+# Model and request config shared by every generate/edit call
+GEMINI_MODEL = "gemini-2.5-flash-preview-05-20"
+
+_GENERATION_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json",
+    response_schema=CVOutput,
+    thinking_config=types.ThinkingConfig(thinking_budget=0)
+)
+
+
+def _get_client():
+    """
+    Get the process-wide Gemini client, creating it on first use.
+    
+    Returns:
+        genai.Client: Shared Gemini client
+    """
+    global _client
+    
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.environ.get('GEMINI_API_KEY')
+                if not api_key:
+                    raise ValueError("GEMINI_API_KEY not found in environment variables")
+                
+                # Size the pools for concurrent requests so calls reuse
+                # kept-alive TLS connections instead of reconnecting
+                limits = httpx.Limits(
+                    max_connections=100,
+                    max_keepalive_connections=50,
+                    keepalive_expiry=30
+                )
+                _client = genai.Client(
+                    api_key=api_key,
+                    http_options=types.HttpOptions(
+                        timeout=GEMINI_TIMEOUT_MS,
+                        client_args={'limits': limits},
+                        async_client_args={'limits': limits}
+                    )
+                )
+    
+    return _client
+
+
+def generate_cv_with_gemini(user_data, job_description, template_name, bypass_cache=False,
+                            on_preamble=None):
+    """
+    Generate CV LaTeX code using Gemini AI.
+    
+    Args:
+        user_data (dict): User information and details
+        job_description (str): Job description to tailor CV for
+        template_name (str): Template name to use
+        bypass_cache (bool): Always call Gemini, ignoring cached responses
+        on_preamble (callable): Called with the LaTeX preamble as soon as it
+            has streamed in, before the rest of the document
         
-        # Generate content with structured output
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-preview-05-20",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                response_schema=CVOutput,
-                thinking_config=types.ThinkingConfig(thinking_budget=0)
-            )
+    Returns:
+        str: Generated LaTeX code
+    """
+    try:
+        latex_code = _run_gemini(
+            _generation_cache_key(user_data, job_description, template_name),
+            lambda: _build_generation_prompt(user_data, job_description, template_name),
+            "Generated",
+            bypass_cache,
+            on_preamble
         )
         
-        # Use the parsed response
-        cv_output: CVOutput = response.parsed
-        latex_code = cv_output.latex_code
+        logger.info("Successfully generated CV with Gemini for template %s", template_name)
+        return latex_code
         
-        # Validate the generated LaTeX
-        if not latex_code or len(latex_code.strip()) < 100:
-            raise Exception("Generated LaTeX code is too short or empty")
+    except Exception:
+        logger.exception("Failed to generate CV with Gemini")
+        # Return fallback template with user data
+        return get_fallback_template(user_data, job_description, template_name)
+
+
+async def generate_cv_with_gemini_async(user_data, job_description, template_name, bypass_cache=False):
+    """
+    Generate CV LaTeX code using Gemini AI without blocking the event loop.
+    
+    Same behaviour as generate_cv_with_gemini, including the fallback
+    template on failure.
+    
+    Args:
+        user_data (dict): User information and details
+        job_description (str): Job description to tailor CV for
+        template_name (str): Template name to use
+        bypass_cache (bool): Always call Gemini, ignoring cached responses
         
-        if not latex_code.strip().startswith('\\documentclass'):
-            raise Exception("Generated code doesn't appear to be valid LaTeX")
+    Returns:
+        str: Generated LaTeX code
+    """
+    try:
+        latex_code = await _run_gemini_async(
+            _generation_cache_key(user_data, job_description, template_name),
+            lambda: _build_generation_prompt(user_data, job_description, template_name),
+            "Generated",
+            bypass_cache
+        )
         
-        logger.info(f"Successfully generated CV with Gemini for template {template_name}")
+        logger.info("Successfully generated CV with Gemini for template %s", template_name)
         return latex_code
         
-    except Exception as e:
-        logger.error(f"Failed to generate CV with Gemini: {str(e)}")
-        # Return fallback template with user data
+    except Exception:
+        logger.exception("Failed to generate CV with Gemini")
         return get_fallback_template(user_data, job_description, template_name)
 
 
-def edit_cv_with_gemini(existing_latex, edit_instructions, user_data, job_description):
+async def generate_cv_with_gemini_batch(jobs, bypass_cache=False):
+    """
+    Generate several CVs concurrently.
+    
+    At most BATCH_CONCURRENCY Gemini calls run at once to stay within the
+    per-minute quota. Each job fails independently to its fallback
+    template, as with generate_cv_with_gemini.
+    
+    Args:
+        jobs (list): (user_data, job_description, template_name) tuples
+        bypass_cache (bool): Always call Gemini, ignoring cached responses
+        
+    Returns:
+        list: Generated LaTeX code, in the same order as jobs
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def run(user_data, job_description, template_name):
+        async with semaphore:
+            return await generate_cv_with_gemini_async(
+                user_data, job_description, template_name, bypass_cache=bypass_cache
+            )
+    
+    return await asyncio.gather(*(run(*job) for job in jobs))
+
+
+def edit_cv_with_gemini(existing_latex, edit_instructions, user_data, job_description, bypass_cache=False):
     """
     Edit existing CV LaTeX code using Gemini AI.
     
@@ -110,90 +354,447 @@ def edit_cv_with_gemini(existing_latex, edit_instructions, user_data, job_descri
         edit_instructions (str): Instructions for editing
         user_data (dict): User information
         job_description (str): Job description context
+        bypass_cache (bool): Always call Gemini, ignoring cached responses
         
     Returns:
         str: Edited LaTeX code
     """
     try:
-        # Configure Gemini
-        api_key = os.environ.get('GEMINI_API_KEY')
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
+        edited_latex = _run_gemini(
+            _edit_cache_key(existing_latex, edit_instructions, user_data, job_description),
+            lambda: _build_edit_prompt(existing_latex, edit_instructions, user_data, job_description),
+            "Edited",
+            bypass_cache
+        )
         
-        client = genai.Client(api_key=api_key)
+        logger.info("Successfully edited CV with Gemini")
+        return edited_latex
         
-        # Create editing prompt
-        prompt = f"""
-You are a professional CV editor with expertise in improving resumes for better job matching.
+    except Exception:
+        logger.exception("Failed to edit CV with Gemini")
+        # Return original LaTeX if editing fails
+        return existing_latex
 
-CURRENT CV LATEX CODE:
-{existing_latex}
 
-USER INFORMATION (for context):
-{format_user_data(user_data)}
+async def edit_cv_with_gemini_async(existing_latex, edit_instructions, user_data, job_description, bypass_cache=False):
+    """
+    Edit existing CV LaTeX code using Gemini AI without blocking the event loop.
+    
+    Same behaviour as edit_cv_with_gemini, including returning the
+    original LaTeX on failure.
+    
+    Args:
+        existing_latex (str): Current LaTeX code
+        edit_instructions (str): Instructions for editing
+        user_data (dict): User information
+        job_description (str): Job description context
+        bypass_cache (bool): Always call Gemini, ignoring cached responses
+        
+    Returns:
+        str: Edited LaTeX code
+    """
+    try:
+        edited_latex = await _run_gemini_async(
+            _edit_cache_key(existing_latex, edit_instructions, user_data, job_description),
+            lambda: _build_edit_prompt(existing_latex, edit_instructions, user_data, job_description),
+            "Edited",
+            bypass_cache
+        )
+        
+        logger.info("Successfully edited CV with Gemini")
+        return edited_latex
+        
+    except Exception:
+        logger.exception("Failed to edit CV with Gemini")
+        return existing_latex
 
-JOB DESCRIPTION (for context):
-{job_description}
 
-EDITING INSTRUCTIONS:
-{edit_instructions}
+def _run_gemini(cache_key, build_prompt, label, bypass_cache=False, on_preamble=None):
+    """
+    Get validated LaTeX for a prompt, from the response cache or Gemini.
+    
+    Args:
+        cache_key (str): Response cache key for this request
+        build_prompt (callable): Returns the prompt; only called on a cache miss
+        label (str): "Generated" or "Edited", used in messages
+        bypass_cache (bool): Always call Gemini, ignoring cached responses
+        on_preamble (callable): Passed to _stream_latex_code
+        
+    Returns:
+        str: LaTeX code
+        
+    Raises:
+        Exception: If Gemini fails or returns unusable output
+    """
+    cached = None if bypass_cache else cache_get_json(cache_key)
+    if cached:
+        logger.info("Using cached Gemini response (%s CV)", label.lower())
+        return cached
+    
+    prompt = build_prompt()
+    _wait_for_quota(prompt)
+    
+    # Stream the structured output, bailing out early if it isn't LaTeX
+    latex_code = _stream_latex_code(prompt, label, on_preamble)
+    
+    _check_latex_output(latex_code, label)
+    _store_cached_latex(cache_key, latex_code)
+    return latex_code
 
-TASK:
-Modify the existing LaTeX CV code according to the editing instructions while:
 
-1. Maintaining the overall structure and formatting
-2. Improving content quality and relevance
-3. Ensuring the CV better matches the job requirements
-4. Keeping all LaTeX syntax valid and compilable
-5. Preserving the professional tone and readability
-6. Making strategic improvements to highlight relevant skills
-7. Optimizing for ATS compatibility
-8. Following the specific editing instructions provided
+async def _run_gemini_async(cache_key, build_prompt, label, bypass_cache=False):
+    """
+    Async variant of _run_gemini.
+    
+    Args:
+        cache_key (str): Response cache key for this request
+        build_prompt (callable): Returns the prompt; only called on a cache miss
+        label (str): "Generated" or "Edited", used in messages
+        bypass_cache (bool): Always call Gemini, ignoring cached responses
+        
+    Returns:
+        str: LaTeX code
+        
+    Raises:
+        Exception: If Gemini fails or returns unusable output
+    """
+    cached = None if bypass_cache else cache_get_json(cache_key)
+    if cached:
+        logger.info("Using cached Gemini response (%s CV)", label.lower())
+        return cached
+    
+    prompt = build_prompt()
+    await _wait_for_quota_async(prompt)
+    
+    latex_code = await _stream_latex_code_async(prompt, label)
+    
+    _check_latex_output(latex_code, label)
+    _store_cached_latex(cache_key, latex_code)
+    return latex_code
 
-IMPORTANT:
-- Return only the complete modified LaTeX code
-- Ensure all changes improve the CV's effectiveness
-- Maintain proper LaTeX formatting and syntax
-- Don't remove essential structural elements
-- Keep the CV concise and focused
 
-Provide the complete edited LaTeX code in the latex_code field.
-"""
+def _quota_buckets(prompt):
+    """Token buckets a Gemini call draws from: one request, and its input tokens."""
+    rpm = current_app.config['GEMINI_RPM']
+    tpm = current_app.config['GEMINI_TPM']
+    return [
+        (f'gemini:rpm:{GEMINI_MODEL}', rpm, rpm / 60, 1),
+        (f'gemini:tpm:{GEMINI_MODEL}', tpm, tpm / 60, len(prompt) // CHARS_PER_TOKEN + 1)
+    ]
+
+
+def _wait_for_quota(prompt):
+    """
+    Wait until the shared Gemini quota has room for a prompt.
+    
+    Waiting here costs nothing, whereas a request sent over quota burns
+    a round trip on a 429 and then backs off anyway.
+    
+    Args:
+        prompt (str): Prompt about to be sent
+    """
+    buckets = _quota_buckets(prompt)
+    deadline = time.monotonic() + GEMINI_QUOTA_MAX_WAIT
+    
+    while True:
+        wait = take_tokens(buckets)
+        if not wait:
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.warning("Waited %ss for Gemini quota, sending anyway", GEMINI_QUOTA_MAX_WAIT)
+            return
+        time.sleep(min(wait, remaining))
+
+
+async def _wait_for_quota_async(prompt):
+    """Async variant of _wait_for_quota."""
+    buckets = _quota_buckets(prompt)
+    deadline = time.monotonic() + GEMINI_QUOTA_MAX_WAIT
+    
+    while True:
+        wait = take_tokens(buckets)
+        if not wait:
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.warning("Waited %ss for Gemini quota, sending anyway", GEMINI_QUOTA_MAX_WAIT)
+            return
+        await asyncio.sleep(min(wait, remaining))
+
+
+def _is_transient_error(exc):
+    """Whether a failed Gemini call is worth retrying (rate limit, 5xx, network)."""
+    if isinstance(exc, (httpx.TransportError, genai_errors.ServerError)):
+        return True
+    return isinstance(exc, genai_errors.ClientError) and exc.code == 429
+
+
+# Retry transient Gemini failures before callers fall back to the template
+_retry_transient = retry(
+    retry=retry_if_exception(_is_transient_error),
+    stop=stop_after_attempt(GEMINI_MAX_ATTEMPTS),
+    wait=wait_exponential_jitter(initial=0.5, max=4),
+    reraise=True
+)
+
+
+@_retry_transient
+def _stream_latex_code(prompt, label, on_preamble=None):
+    """
+    Stream a structured CVOutput response from Gemini and return its LaTeX.
+    
+    The stream is abandoned as soon as the start of the output shows it
+    is not a LaTeX document, rather than waiting for the full response.
+    
+    Args:
+        prompt (str): Prompt to send
+        label (str): "Generated" or "Edited", used in error messages
+        on_preamble (callable): Called once with the decoded preamble when
+            \\begin{document} arrives (again if a retry restarts the stream)
         
-        # Generate edited content
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-preview-05-20",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                response_schema=CVOutput,
-                thinking_config=types.ThinkingConfig(thinking_budget=0)
-            )
-        )
+    Returns:
+        str: LaTeX code from the latex_code field
+    """
+    chunks = []
+    head_checked = False
+    preamble_sent = on_preamble is None
+    
+    stream = _get_client().models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=prompt,
+        config=_GENERATION_CONFIG
+    )
+    for chunk in stream:
+        if chunk.text:
+            chunks.append(chunk.text)
+        if not head_checked:
+            head_checked = _check_stream_head(chunks, label)
+        if head_checked and not preamble_sent:
+            preamble = _streamed_preamble(''.join(chunks))
+            if preamble is not None:
+                preamble_sent = True
+                on_preamble(preamble)
+    
+    # response_schema already enforces the shape server-side, so read the
+    # field straight from the JSON instead of building a CVOutput
+    return orjson.loads(''.join(chunks))['latex_code']
+
+
+@_retry_transient
+async def _stream_latex_code_async(prompt, label):
+    """
+    Async variant of _stream_latex_code.
+    
+    Args:
+        prompt (str): Prompt to send
+        label (str): "Generated" or "Edited", used in error messages
         
-        # Use the parsed response
-        cv_output: CVOutput = response.parsed
-        edited_latex = cv_output.latex_code
+    Returns:
+        str: LaTeX code from the latex_code field
+    """
+    chunks = []
+    head_checked = False
+    
+    stream = await _get_client().aio.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=prompt,
+        config=_GENERATION_CONFIG
+    )
+    async for chunk in stream:
+        if chunk.text:
+            chunks.append(chunk.text)
+        if not head_checked:
+            head_checked = _check_stream_head(chunks, label)
+    
+    # response_schema already enforces the shape server-side, so read the
+    # field straight from the JSON instead of building a CVOutput
+    return orjson.loads(''.join(chunks))['latex_code']
+
+
+def _check_stream_head(chunks, label):
+    """
+    Check the first streamed characters for the start of a LaTeX document.
+    
+    Args:
+        chunks (list): Response text received so far
+        label (str): "Generated" or "Edited", used in error messages
         
-        # Validate the edited LaTeX
-        if not edited_latex or len(edited_latex.strip()) < 100:
-            raise Exception("Edited LaTeX code is too short or empty")
+    Returns:
+        bool: True once the output is known to start a LaTeX document
         
-        if not edited_latex.strip().startswith('\\documentclass'):
-            raise Exception("Edited code doesn't appear to be valid LaTeX")
+    Raises:
+        Exception: If enough output has arrived without a \\documentclass
+    """
+    head = ''.join(chunks)
+    
+    # The LaTeX sits inside a JSON string, so its backslash is escaped
+    if '\\\\documentclass' in head:
+        return True
+    
+    if len(head) >= STREAM_HEAD_CHARS:
+        raise Exception(f"{label} code doesn't appear to be valid LaTeX")
+    
+    return False
+
+
+def _streamed_preamble(head):
+    """
+    Decode the LaTeX preamble from the start of a streamed CVOutput body.
+    
+    Args:
+        head (str): JSON response text received so far
         
-        logger.info(f"Successfully edited CV with Gemini")
-        return edited_latex
+    Returns:
+        str: Source before \\begin{document}, or None if it hasn't all arrived
+    """
+    end = head.find(_STREAM_PREAMBLE_END)
+    if end == -1:
+        return None
+    
+    key = head.find('"latex_code"')
+    if key == -1 or key > end:
+        return None
+    start = head.find('"', head.find(':', key)) + 1
+    
+    # The marker starts on an escape boundary, so this is a whole JSON string
+    try:
+        return orjson.loads('"' + head[start:end] + '"')
+    except orjson.JSONDecodeError:
+        return None
+
+
+def _build_generation_prompt(user_data, job_description, template_name):
+    """Build the Gemini prompt for generating a new CV."""
+    return ''.join((
+        _GENERATE_PROMPT_PREFIX,
+        '\nUSER INFORMATION:\n', format_user_data(user_data),
+        '\n\nJOB DESCRIPTION TO TAILOR FOR:\n', job_description,
+        '\n\nLATEX TEMPLATE TO CUSTOMIZE:\n', load_template(template_name),
+        _GENERATE_PROMPT_SUFFIX
+    ))
+
+
+def _build_edit_prompt(existing_latex, edit_instructions, user_data, job_description):
+    """Build the Gemini prompt for editing an existing CV."""
+    return ''.join((
+        _EDIT_PROMPT_PREFIX,
+        '\nCURRENT CV LATEX CODE:\n', existing_latex,
+        '\n\nUSER INFORMATION (for context):\n', format_user_data(user_data),
+        '\n\nJOB DESCRIPTION (for context):\n', job_description,
+        '\n\nEDITING INSTRUCTIONS:\n', edit_instructions,
+        _EDIT_PROMPT_SUFFIX
+    ))
+
+
+def _response_cache_key(kind, **inputs):
+    """
+    Build the cache key for a Gemini response from the request inputs.
+    
+    Args:
+        kind (str): "generate" or "edit"
+        **inputs: Values that fully determine the prompt
         
-    except Exception as e:
-        logger.error(f"Failed to edit CV with Gemini: {str(e)}")
-        # Return original LaTeX if editing fails
-        return existing_latex
+    Returns:
+        str: Redis key
+    """
+    payload = json.dumps(inputs, sort_keys=True, default=str).encode('utf-8')
+    return f'gemini:{kind}:{hashlib.blake2b(payload).hexdigest()}'
+
+
+def _generation_cache_key(user_data, job_description, template_name):
+    """
+    Response cache key for a CV generation request.
+    
+    The job description is keyed with its whitespace collapsed, so a JD
+    pasted again with different line breaks or spacing still hits. The
+    template is keyed by the content this process loaded; templates are
+    read at startup, so after one is edited and the workers restart, its
+    old responses stop being served without waiting out GEMINI_CACHE_TTL.
+    """
+    return _response_cache_key(
+        'generate', user_data=user_data,
+        job_description=_normalize_whitespace(job_description),
+        template_name=template_name, template_digest=_template_digest(template_name)
+    )
+
+
+def _normalize_whitespace(text):
+    """Collapse runs of whitespace to single spaces for cache keys."""
+    return _WHITESPACE_RE.sub(' ', text).strip() if isinstance(text, str) else text
+
+
+def _template_digest(template_name):
+    """Short content hash of a template, for response cache keys."""
+    return _content_digest(load_template(template_name))
+
+
+@lru_cache(maxsize=32)
+def _content_digest(template):
+    """Memoized by content, so a fallback served once never sticks to a name."""
+    return hashlib.blake2b(template.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _edit_cache_key(existing_latex, edit_instructions, user_data, job_description):
+    """Response cache key for a CV edit request."""
+    return _response_cache_key(
+        'edit', existing_latex=existing_latex, edit_instructions=edit_instructions,
+        user_data=user_data, job_description=job_description
+    )
+
+
+def _store_cached_latex(cache_key, latex_code):
+    """Remember validated Gemini output so identical requests skip the API."""
+    cache_set_json(cache_key, latex_code, current_app.config['GEMINI_CACHE_TTL'])
+
+
+def _check_latex_output(latex_code, label):
+    """
+    Reject Gemini output that is empty or doesn't look like a LaTeX document.
+    
+    Args:
+        latex_code (str): LaTeX code returned by Gemini
+        label (str): "Generated" or "Edited", used in error messages
+        
+    Raises:
+        Exception: If the output is unusable
+    """
+    if not latex_code or len(latex_code) < 100:
+        raise Exception(f"{label} LaTeX code is too short or empty")
+    
+    # Only look at the head so the multi-KB body is never copied
+    if not latex_code[:OUTPUT_HEAD_CHARS].lstrip().startswith('\\documentclass'):
+        raise Exception(f"{label} code doesn't appear to be valid LaTeX")
+
+
+def _preload_templates():
+    """
+    Read every LaTeX template into memory.
+    
+    Returns:
+        dict: Template content keyed by template name
+    """
+    templates = {}
+    
+    try:
+        with os.scandir(TEMPLATE_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith('.tex') and entry.is_file():
+                    with open(entry.path, 'r', encoding='utf-8') as f:
+                        templates[entry.name[:-len('.tex')]] = f.read()
+    except OSError as e:
+        logger.warning("Could not preload LaTeX templates from %s: %s", TEMPLATE_DIR, e)
+    
+    return templates
 
 
 def load_template(template_name):
     """
-    Load LaTeX template from file.
+    Load LaTeX template.
+    
+    Templates are read once at import, so this is a dict lookup; names
+    missing from the preload fall back to a disk read, cached only once it
+    succeeds (the basic template served on a failed read is not).
     
     Args:
         template_name (str): Name of the template
@@ -201,25 +802,86 @@ def load_template(template_name):
     Returns:
         str: Template content
     """
+    template = _TEMPLATES.get(template_name)
+    if template is not None:
+        return template
+    
+    template = _read_template(template_name)
+    if template is None:
+        # Not cached, so a transient failure is retried on the next call
+        return get_basic_template()
+    
+    _TEMPLATES[template_name] = template
+    return template
+
+
+def _read_template(template_name):
+    """
+    Load LaTeX template from file.
+    
+    Args:
+        template_name (str): Name of the template
+        
+    Returns:
+        str: Template content, or None if it could not be read
+    """
     try:
-        template_path = f'latex_templates/{template_name}.tex'
+        template_path = os.path.join(TEMPLATE_DIR, f'{template_name}.tex')
         
         if os.path.exists(template_path):
             with open(template_path, 'r', encoding='utf-8') as f:
                 return f.read()
         else:
-            logger.warning(f"Template file not found: {template_path}")
-            return get_basic_template()
+            logger.warning("Template file not found: %s", template_path)
+            return None
             
-    except Exception as e:
-        logger.error(f"Error loading template {template_name}: {str(e)}")
-        return get_basic_template()
+    except Exception:
+        logger.exception("Error loading template %s", template_name)
+        return None
+
+
+_TEMPLATES = _preload_templates()
 
 
 def format_user_data(user_data):
     """
     Format user data for the prompt.
     
+    Results are memoized for flat user data (scalar and list values), so
+    regenerating or editing with the same details skips the formatting.
+    
+    Args:
+        user_data (dict): User information
+        
+    Returns:
+        str: Formatted user data string
+    """
+    try:
+        frozen = tuple(
+            (key, tuple(value) if isinstance(value, list) else value)
+            for key, value in user_data.items()
+        )
+        hash(frozen)
+    except (AttributeError, TypeError):
+        # Nested or non-dict data isn't hashable; format it directly
+        return _format_user_data(user_data)
+    
+    return _format_user_data_cached(frozen)
+
+
+@lru_cache(maxsize=256)
+def _format_user_data_cached(frozen):
+    """Format user data frozen by format_user_data into (key, value) pairs."""
+    return _format_user_data({
+        key: list(value) if isinstance(value, tuple) else value
+        for key, value in frozen
+    })
+
+
+def _format_user_data(user_data):
+    """
+    Format user data for the prompt without memoization.
+    
     Args:
         user_data (dict): User information
         
@@ -229,63 +891,23 @@ def format_user_data(user_data):
     try:
         formatted_lines = []
         
-        # Basic information
-        if user_data.get('name'):
-            formatted_lines.append(f"Name: {user_data['name']}")
-        if user_data.get('email'):
-            formatted_lines.append(f"Email: {user_data['email']}")
-        if user_data.get('phone'):
-            formatted_lines.append(f"Phone: {user_data['phone']}")
-        if user_data.get('location'):
-            formatted_lines.append(f"Location: {user_data['location']}")
-        if user_data.get('linkedin'):
-            formatted_lines.append(f"LinkedIn: {user_data['linkedin']}")
-        if user_data.get('website'):
-            formatted_lines.append(f"Website: {user_data['website']}")
-        
-        # Professional summary
-        if user_data.get('summary'):
-            formatted_lines.append(f"\nProfessional Summary:\n{user_data['summary']}")
-        
-        # Experience
-        if user_data.get('experience'):
-            formatted_lines.append(f"\nExperience:\n{user_data['experience']}")
-        
-        # Skills
-        if user_data.get('skills'):
-            if isinstance(user_data['skills'], list):
-                skills_str = ', '.join(user_data['skills'])
-            else:
-                skills_str = str(user_data['skills'])
-            formatted_lines.append(f"\nSkills: {skills_str}")
-        
-        # Education
-        if user_data.get('education'):
-            formatted_lines.append(f"\nEducation:\n{user_data['education']}")
-        
-        # Projects
-        if user_data.get('projects'):
-            formatted_lines.append(f"\nProjects:\n{user_data['projects']}")
-        
-        # Certifications
-        if user_data.get('certifications'):
-            formatted_lines.append(f"\nCertifications:\n{user_data['certifications']}")
-        
-        # Languages
-        if user_data.get('languages'):
-            formatted_lines.append(f"\nLanguages: {user_data['languages']}")
+        # Known sections, in their fixed order
+        for key, template in _USER_DATA_SECTIONS:
+            value = user_data.get(key)
+            if value:
+                if key == 'skills' and isinstance(value, list):
+                    value = ', '.join(value)
+                formatted_lines.append(template.format(value))
         
         # Additional sections
         for key, value in user_data.items():
-            if key not in ['name', 'email', 'phone', 'location', 'linkedin', 'website', 
-                          'summary', 'experience', 'skills', 'education', 'projects', 
-                          'certifications', 'languages'] and value:
+            if value and key not in _KNOWN_USER_DATA_KEYS:
                 formatted_lines.append(f"\n{key.title()}: {value}")
         
         return '\n'.join(formatted_lines)
         
-    except Exception as e:
-        logger.error(f"Error formatting user data: {str(e)}")
+    except Exception:
+        logger.exception("Error formatting user data")
         return str(user_data)
 
 
@@ -296,55 +918,7 @@ def get_basic_template():
     Returns:
         str: Basic LaTeX template
     """
-    return r"""
-\documentclass[11pt,a4paper,sans]{moderncv}
-\moderncvstyle{classic}
-\moderncvcolor{blue}
-\usepackage[scale=0.75]{geometry}
-\usepackage[utf8]{inputenc}
-
-% Personal data
-\name{[NAME]}{\space}
-\title{[TITLE]}
-\address{[ADDRESS]}{\space}{\space}
-\phone[mobile]{[PHONE]}
-\email{[EMAIL]}
-\social[linkedin]{[LINKEDIN]}
-\social[github]{[GITHUB]}
-
-\begin{document}
-\makecvtitle
-
-\section{Professional Summary}
-[SUMMARY]
-
-\section{Experience}
-\cventry{[YEAR]--[YEAR]}{[POSITION]}{[COMPANY]}{[LOCATION]}{}{%
-[DESCRIPTION]
-\begin{itemize}%
-\item [ACHIEVEMENT_1]
-\item [ACHIEVEMENT_2]
-\item [ACHIEVEMENT_3]
-\end{itemize}}
-
-\section{Education}
-\cventry{[YEAR]--[YEAR]}{[DEGREE]}{[INSTITUTION]}{[LOCATION]}{\textit{[GPA]}}{[DESCRIPTION]}
-
-\section{Skills}
-\cvitemwithcomment{Programming}{[PROGRAMMING_SKILLS]}{[LEVEL]}
-\cvitemwithcomment{Technologies}{[TECH_SKILLS]}{[LEVEL]}
-\cvitemwithcomment{Languages}{[LANGUAGES]}{[LEVEL]}
-
-\section{Projects}
-\cventry{[YEAR]}{[PROJECT_NAME]}{[TECH_STACK]}{}{}{%
-[PROJECT_DESCRIPTION]
-\begin{itemize}%
-\item [FEATURE_1]
-\item [FEATURE_2]
-\end{itemize}}
-
-\end{document}
-"""
+    return _BASIC_TEMPLATE
 
 
 def get_fallback_template(user_data, job_description, template_name):
@@ -364,45 +938,47 @@ def get_fallback_template(user_data, job_description, template_name):
         
         # Basic substitutions
         substitutions = {
-            '[NAME]': user_data.get('name', 'Your Name'),
-            '[TITLE]': extract_job_title(job_description) or 'Professional',
-            '[EMAIL]': user_data.get('email', 'your.email@example.com'),
-            '[PHONE]': user_data.get('phone', '+1-234-567-8900'),
-            '[ADDRESS]': user_data.get('location', 'Your City, Country'),
-            '[LINKEDIN]': user_data.get('linkedin', 'yourlinkedin'),
-            '[GITHUB]': user_data.get('github', 'yourgithub'),
-            '[SUMMARY]': user_data.get('summary', 'Professional with relevant experience.'),
-            '[YEAR]': '2020',
-            '[POSITION]': 'Position Title',
-            '[COMPANY]': 'Company Name',
-            '[LOCATION]': 'City, Country',
-            '[DESCRIPTION]': user_data.get('experience', 'Professional experience description.'),
-            '[ACHIEVEMENT_1]': 'Key achievement or responsibility',
-            '[ACHIEVEMENT_2]': 'Another important accomplishment',
-            '[ACHIEVEMENT_3]': 'Additional relevant experience',
-            '[DEGREE]': user_data.get('education', 'Bachelor\'s Degree'),
-            '[INSTITUTION]': 'University Name',
-            '[GPA]': 'GPA',
-            '[PROGRAMMING_SKILLS]': ', '.join(user_data.get('skills', ['Python', 'JavaScript'])) if isinstance(user_data.get('skills'), list) else str(user_data.get('skills', 'Programming Languages')),
-            '[TECH_SKILLS]': 'React, Node.js, Docker',
-            '[LANGUAGES]': 'English (Native), Spanish (Intermediate)',
-            '[LEVEL]': 'Advanced',
-            '[PROJECT_NAME]': 'Project Name',
-            '[TECH_STACK]': 'Technology Stack',
-            '[PROJECT_DESCRIPTION]': 'Project description and impact.',
-            '[FEATURE_1]': 'Key feature or accomplishment',
-            '[FEATURE_2]': 'Another important feature'
+            'NAME': user_data.get('name', 'Your Name'),
+            'TITLE': extract_job_title(job_description) or 'Professional',
+            'EMAIL': user_data.get('email', 'your.email@example.com'),
+            'PHONE': user_data.get('phone', '+1-234-567-8900'),
+            'ADDRESS': user_data.get('location', 'Your City, Country'),
+            'LINKEDIN': user_data.get('linkedin', 'yourlinkedin'),
+            'GITHUB': user_data.get('github', 'yourgithub'),
+            'SUMMARY': user_data.get('summary', 'Professional with relevant experience.'),
+            'YEAR': '2020',
+            'POSITION': 'Position Title',
+            'COMPANY': 'Company Name',
+            'LOCATION': 'City, Country',
+            'DESCRIPTION': user_data.get('experience', 'Professional experience description.'),
+            'ACHIEVEMENT_1': 'Key achievement or responsibility',
+            'ACHIEVEMENT_2': 'Another important accomplishment',
+            'ACHIEVEMENT_3': 'Additional relevant experience',
+            'DEGREE': user_data.get('education', 'Bachelor\'s Degree'),
+            'INSTITUTION': 'University Name',
+            'GPA': 'GPA',
+            'PROGRAMMING_SKILLS': ', '.join(user_data.get('skills', ['Python', 'JavaScript'])) if isinstance(user_data.get('skills'), list) else str(user_data.get('skills', 'Programming Languages')),
+            'TECH_SKILLS': 'React, Node.js, Docker',
+            'LANGUAGES': 'English (Native), Spanish (Intermediate)',
+            'LEVEL': 'Advanced',
+            'PROJECT_NAME': 'Project Name',
+            'TECH_STACK': 'Technology Stack',
+            'PROJECT_DESCRIPTION': 'Project description and impact.',
+            'FEATURE_1': 'Key feature or accomplishment',
+            'FEATURE_2': 'Another important feature'
         }
         
-        # Apply substitutions
-        for placeholder, replacement in substitutions.items():
-            template = template.replace(placeholder, replacement)
+        # Apply all substitutions in one pass; unknown placeholders are kept
+        template = _PLACEHOLDER_RE.sub(
+            lambda match: substitutions.get(match.group(1), match.group(0)),
+            template
+        )
         
-        logger.info(f"Generated fallback template for {template_name}")
+        logger.info("Generated fallback template for %s", template_name)
         return template
         
-    except Exception as e:
-        logger.error(f"Error generating fallback template: {str(e)}")
+    except Exception:
+        logger.exception("Error generating fallback template")
         return get_basic_template()
 
 
@@ -418,25 +994,14 @@ def extract_job_title(job_description):
     """
     try:
         # Simple extraction logic - look for common patterns
-        job_description_lower = job_description.lower()
-        
-        common_titles = [
-            'software engineer', 'software developer', 'full stack developer',
-            'frontend developer', 'backend developer', 'data scientist',
-            'product manager', 'project manager', 'marketing manager',
-            'sales representative', 'business analyst', 'ux designer',
-            'ui designer', 'graphic designer', 'content writer',
-            'digital marketer', 'account manager', 'consultant'
-        ]
-        
-        for title in common_titles:
-            if title in job_description_lower:
-                return title.title()
+        match = _COMMON_TITLE_RE.search(job_description)
+        if match:
+            return match.group(1).lower().title()
         
         # If no common title found, try to extract from first few words
         words = job_description.split()[:10]
         for i, word in enumerate(words):
-            if word.lower() in ['engineer', 'developer', 'manager', 'analyst', 'designer', 'specialist']:
+            if word.lower() in _TITLE_WORDS:
                 if i > 0:
                     return ' '.join(words[max(0, i-2):i+1]).title()
                 else:
@@ -444,8 +1009,8 @@ def extract_job_title(job_description):
         
         return None
         
-    except Exception as e:
-        logger.error(f"Error extracting job title: {str(e)}")
+    except Exception:
+        logger.exception("Error extracting job title")
         return None
 
 
@@ -460,16 +1025,19 @@ def validate_latex_code(latex_code):
         tuple: (is_valid, error_message)
     """
     try:
-        if not latex_code or not latex_code.strip():
+        # Only the leading whitespace matters, so skip copying the whole body
+        if not latex_code or latex_code.isspace():
             return False, "LaTeX code is empty"
         
-        if not latex_code.strip().startswith('\\documentclass'):
+        if not latex_code.lstrip().startswith('\\documentclass'):
             return False, "LaTeX code must start with \\documentclass"
         
-        if '\\begin{document}' not in latex_code:
+        begin = latex_code.find('\\begin{document}')
+        if begin == -1:
             return False, "LaTeX code must contain \\begin{document}"
         
-        if '\\end{document}' not in latex_code:
+        # \end{document} can only follow \begin{document}
+        if latex_code.find('\\end{document}', begin) == -1:
             return False, "LaTeX code must contain \\end{document}"
         
         # Check for balanced braces (basic check)
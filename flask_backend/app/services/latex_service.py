@@ -1,17 +1,103 @@
 import os
+import re
 import subprocess
 import logging
 import tempfile
 import shutil
+import hashlib
+import threading
+import atexit
+from functools import lru_cache
 from flask import current_app
 from PIL import Image, ImageDraw, ImageFont
 import fitz  # PyMuPDF
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter, A4
-from io import BytesIO
 
 logger = logging.getLogger(__name__)
 
+# Seconds a single pdflatex run may take
+PDFLATEX_TIMEOUT = 30
+
+# Bounding box for JPG previews (pixels)
+PREVIEW_MAX_WIDTH = 1200
+PREVIEW_MAX_HEIGHT = 1600
+
+# Absolute pdflatex path, resolved once so compiles skip the PATH lookup
+PDFLATEX_PATH = shutil.which('pdflatex')
+
+# RAM-backed directory for pdflatex scratch output (None: system temp dir)
+SCRATCH_ROOT = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Where preamble formats dumped by _preamble_format are kept: a private
+# (0700) directory per process tree, created before workers fork so they
+# share it, and removed when the creating process exits
+FORMAT_CACHE_DIR = tempfile.mkdtemp(prefix='morphcv_formats_')
+_FORMAT_CACHE_OWNER = os.getpid()
+
+# Most formats kept in FORMAT_CACHE_DIR; least recently used go first
+FORMAT_CACHE_SIZE = 16
+
+# pdflatex environment with FORMAT_CACHE_DIR ahead of the default format path
+_PDFLATEX_ENV = dict(os.environ, TEXFORMATS=FORMAT_CACHE_DIR + os.pathsep)
+
+# Start of a \hypersetup call; these often carry the CV owner's name
+# (pdftitle), so they are left out of the dumped preamble
+_HYPERSETUP_RE = re.compile(r'\\hypersetup\s*\{')
+
+# Patterns used by _extract_content_from_latex, compiled once at import
+_NAME_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE) for pattern in (
+        r'\\name\{([^}]+)\}',
+        r'\\textbf\{([^}]{1,80})\}[^\n]{0,200}?(?:CV|Resume)',
+        r'\\LARGE\s*\\textbf\{([^}]+)\}',
+        r'\\huge\s*([^\\]+)'
+    )
+]
+_EMAIL_RE = re.compile(r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})')
+# Bounded so long runs of digits/whitespace can't drive backtracking
+_PHONE_RE = re.compile(r'(\+?\d[\d\s\-().]{8,28}\d)')
+# Every \section header with its body, found in one sweep
+_SECTION_RE = re.compile(r'\\section\*?\{([^}]*)\}(.*?)(?=\\section|\Z)', re.DOTALL)
+_SECTION_KEYS = ('summary', 'experience', 'skills', 'education')
+_COMMAND_WITH_ARG_RE = re.compile(r'\\[a-zA-Z]+\{([^}]*)\}')
+_COMMAND_RE = re.compile(r'\\[a-zA-Z]+')
+_BRACE_RE = re.compile(r'\{|\}')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Commands whose targets are only resolved on a second pdflatex pass
+_REFERENCE_RE = re.compile(r'\\(?:ref|pageref|cite|label)\b')
+
+# .aux file kept in the CV directory between compiles, so an edited CV
+# starts with its references already resolved
+AUX_FILE = 'cv.aux'
+
+# Log message pdflatex writes when references changed since the .aux
+_RERUN_MARKER = b'Rerun to get'
+
+# LaTeX build by-products removed by cleanup_temp_files
+TEMP_FILE_EXTENSIONS = ('.aux', '.log', '.out', '.fdb_latexmk', '.fls', '.synctex.gz')
+
+# Commands validate_latex_code rejects (security)
+DANGEROUS_COMMANDS = ('\\write18', '\\input', '\\include', '\\openin', '\\openout')
+
+# Largest source validate_latex_code will scan (characters or bytes)
+MAX_LATEX_LENGTH = 1024 * 1024
+
+# Every token validate_latex_code looks for; all start with a backslash
+# and none contains another, so one non-overlapping scan finds them all.
+# Command names must end there, so \\includegraphics is not \\include
+_VALIDATION_TOKEN_RE = re.compile('|'.join(
+    re.escape(token) + ('(?![a-zA-Z])' if token[-1].isalpha() else '')
+    for token in
+    ('\\documentclass', '\\begin{document}', '\\end{document}') + DANGEROUS_COMMANDS
+))
+# The same scan over UTF-8 source bytes; the tokens are pure ASCII
+_VALIDATION_TOKEN_BYTES_RE = re.compile(_VALIDATION_TOKEN_RE.pattern.encode('ascii'))
+
+# Preamble format names that failed to build; not retried
+_failed_formats = set()
+
 
 def compile_latex_to_pdf(cv_uuid, latex_code, user_tier):
     """
@@ -26,20 +112,17 @@ def compile_latex_to_pdf(cv_uuid, latex_code, user_tier):
         tuple: (pdf_path, jpg_path) or raises exception on failure
     """
     try:
-        # Create user directory
-        base_dir = current_app.config.get('UPLOAD_FOLDER', 'user_data')
-        user_dir = os.path.join(base_dir, f'cv_{cv_uuid}')
-        os.makedirs(user_dir, exist_ok=True)
-        
-        # Write LaTeX file
-        tex_file = os.path.join(user_dir, 'cv.tex')
-        with open(tex_file, 'w', encoding='utf-8') as f:
-            f.write(latex_code)
-        
-        logger.info(f'Wrote LaTeX file for CV {cv_uuid}')
+        # Create user directory and write LaTeX file
+        user_dir = _cv_dir(cv_uuid)
+        preamble_format, source = _preamble_format(latex_code)
+        _write_latex_source(user_dir, source, cv_uuid)
         
         # Try to compile with pdflatex
-        pdf_path, jpg_path = _compile_with_pdflatex(user_dir, user_tier, cv_uuid)
+        pdf_path, jpg_path = _compile_with_pdflatex(
+            user_dir, user_tier, cv_uuid,
+            resolve_references=_needs_reference_pass(latex_code),
+            preamble_format=preamble_format
+        )
         
         if pdf_path and os.path.exists(pdf_path):
             logger.info(f'Successfully compiled LaTeX to PDF for CV {cv_uuid}')
@@ -55,55 +138,434 @@ def compile_latex_to_pdf(cv_uuid, latex_code, user_tier):
         return _create_dummy_files(user_dir, user_tier, cv_uuid)
 
 
-def _compile_with_pdflatex(user_dir, user_tier, cv_uuid):
+def _cv_dir(cv_uuid):
+    """Directory holding a CV's source and output files."""
+    base_dir = current_app.config.get('UPLOAD_FOLDER', 'user_data')
+    return os.path.join(base_dir, f'cv_{cv_uuid}')
+
+
+def _write_latex_source(user_dir, latex_code, cv_uuid):
     """
-    Compile LaTeX using pdflatex system command.
+    Create the CV's directory and write its LaTeX source.
     
     Args:
-        user_dir (str): Directory containing LaTeX files
-        user_tier (str): User subscription tier
+        user_dir (str): CV directory
+        latex_code (str): LaTeX source code
         cv_uuid (str): CV UUID
+    """
+    os.makedirs(user_dir, exist_ok=True)
+    
+    tex_file = os.path.join(user_dir, 'cv.tex')
+    with open(tex_file, 'w', encoding='utf-8') as f:
+        f.write(latex_code)
+    
+    logger.info(f'Wrote LaTeX file for CV {cv_uuid}')
+
+
+def _pdflatex_available():
+    """
+    Check whether pdflatex was found on PATH at import.
+    
+    Returns:
+        bool: True if pdflatex is available
+    """
+    if not PDFLATEX_PATH:
+        logger.warning('pdflatex not available')
+        return False
+    return True
+
+
+def _needs_reference_pass(latex_code):
+    """Whether the source uses cross-references that need a second pdflatex pass."""
+    return _REFERENCE_RE.search(latex_code) is not None
+
+
+def _preamble_format(latex_code):
+    """
+    Get a precompiled pdflatex format holding the source's preamble.
+    
+    Loading the document class and packages dominates short compiles.
+    mylatexformat dumps the preamble into a .fmt once; compiles using it
+    skip straight to the body. Only the static part of the preamble is
+    dumped: per-CV \\hypersetup calls are moved after \\endofdump, so
+    CVs generated from the same template preamble share one format.
+    
+    Args:
+        latex_code (str): LaTeX source code
         
     Returns:
-        tuple: (pdf_path, jpg_path) or (None, None) if failed
+        tuple: (format name for pdflatex -fmt, source to compile with it),
+            or (None, latex_code) to compile without a format
     """
-    try:
-        # Check if pdflatex is available
-        result = subprocess.run(['pdflatex', '--version'], 
-                              capture_output=True, check=True, timeout=10)
-        logger.info('pdflatex is available')
+    if not PDFLATEX_PATH:
+        return None, latex_code
+    
+    preamble, found, body = latex_code.partition('\\begin{document}')
+    if not found:
+        return None, latex_code
+    
+    static_preamble, hypersetup = _split_preamble(preamble)
+    name = _format_name(static_preamble)
+    if name in _failed_formats:
+        return None, latex_code
+    
+    if not _use_cached_format(name) and not _build_format(name, static_preamble):
+        return None, latex_code
+    
+    return name, f'{static_preamble}\\endofdump\n{hypersetup}\n\\begin{{document}}{body}'
+
+
+def _split_preamble(preamble):
+    """
+    Split the \\hypersetup calls out of a preamble.
+    
+    Args:
+        preamble (str): LaTeX source before \\begin{document}
         
-    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
-        logger.warning('pdflatex not available or timed out')
-        return None, None
+    Returns:
+        tuple: (preamble without them, the calls joined by newlines)
+    """
+    static_parts, hypersetup_calls = [], []
+    pos = 0
+    for match in _HYPERSETUP_RE.finditer(preamble):
+        line_start = preamble.rfind('\n', 0, match.start()) + 1
+        if match.start() < pos or '%' in preamble[line_start:match.start()]:
+            continue  # Inside an earlier call, or commented out
+        depth, end = 1, match.end()
+        while depth and end < len(preamble):
+            char = preamble[end]
+            if char == '\\':
+                end += 2
+                continue
+            depth += (char == '{') - (char == '}')
+            end += 1
+        if depth:
+            break  # Unbalanced; leave the rest of the preamble as it is
+        static_parts.append(preamble[pos:match.start()])
+        hypersetup_calls.append(preamble[match.start():end])
+        pos = end
+    static_parts.append(preamble[pos:])
+    return ''.join(static_parts), '\n'.join(hypersetup_calls)
+
+
+def _format_name(static_preamble):
+    """Format name for a static preamble, keyed by its content."""
+    return 'cv-' + hashlib.blake2b(static_preamble.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _use_cached_format(name):
+    """Mark a cached format as recently used; False if it isn't cached."""
+    try:
+        os.utime(os.path.join(FORMAT_CACHE_DIR, f'{name}.fmt'))
+        return True
+    except OSError:
+        return False
+
+
+def _build_format(name, static_preamble):
+    """
+    Dump a static preamble into FORMAT_CACHE_DIR as the named format.
     
+    The format is built from a stub document holding only the preamble,
+    then moved into place so concurrent compiles never load a half-written
+    format. Names that fail to build are not retried.
+    
+    Args:
+        name (str): Format name from _format_name
+        static_preamble (str): Preamble to dump
+        
+    Returns:
+        bool: True if the format is ready
+    """
+    source_dir = tempfile.mkdtemp(prefix='preamble_', dir=SCRATCH_ROOT)
+    build_dir = tempfile.mkdtemp(dir=FORMAT_CACHE_DIR)
     try:
-        # Compile LaTeX with timeout
-        cmd = [
-            'pdflatex',
-            '-interaction=nonstopmode',
-            '-output-directory', user_dir,
-            'cv.tex'
-        ]
+        with open(os.path.join(source_dir, 'cv.tex'), 'w', encoding='utf-8') as f:
+            f.write(static_preamble + '\\begin{document}\n\\end{document}\n')
         
-        # Run compilation with timeout
         result = subprocess.run(
-            cmd, 
-            cwd=user_dir, 
-            capture_output=True, 
-            text=True, 
-            timeout=30
+            [
+                PDFLATEX_PATH,
+                '-ini',
+                '-interaction=nonstopmode',
+                f'-jobname={name}',
+                '-output-directory', build_dir,
+                '&pdflatex', 'mylatexformat.ltx', 'cv.tex'
+            ],
+            cwd=source_dir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=PDFLATEX_TIMEOUT
         )
+        built_path = os.path.join(build_dir, f'{name}.fmt')
+        if result.returncode != 0 or not os.path.exists(built_path):
+            logger.warning(f'Could not build preamble format {name}, compiling without it')
+            _failed_formats.add(name)
+            return False
+        os.replace(built_path, os.path.join(FORMAT_CACHE_DIR, f'{name}.fmt'))
         
-        pdf_path = os.path.join(user_dir, 'cv.pdf')
+    except Exception as e:
+        logger.warning(f'Preamble format error: {str(e)}')
+        _failed_formats.add(name)
+        return False
+    finally:
+        shutil.rmtree(source_dir, ignore_errors=True)
+        shutil.rmtree(build_dir, ignore_errors=True)
+    
+    logger.info(f'Built preamble format {name}')
+    _evict_formats()
+    return True
+
+
+def _evict_formats():
+    """Remove the least recently used formats beyond FORMAT_CACHE_SIZE."""
+    try:
+        with os.scandir(FORMAT_CACHE_DIR) as entries:
+            formats = [
+                (entry.stat().st_mtime, entry.path) for entry in entries
+                if entry.name.endswith('.fmt')
+            ]
+    except OSError:
+        return
+    
+    formats.sort(reverse=True)
+    for _, path in formats[FORMAT_CACHE_SIZE:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@atexit.register
+def _remove_format_cache():
+    """Remove FORMAT_CACHE_DIR when the process that created it exits."""
+    if os.getpid() == _FORMAT_CACHE_OWNER:
+        shutil.rmtree(FORMAT_CACHE_DIR, ignore_errors=True)
+
+
+def start_preamble_format(preamble, template_latex):
+    """
+    Start building the format for a preamble ahead of its compile.
+    
+    Called while Gemini is still streaming the rest of the document, so a
+    template's format is usually ready by the time the compile needs it.
+    Only preambles matching their template's (static) preamble are built
+    here; one Gemini rewrote is unlikely to be shared, so it isn't worth
+    a build competing with running compiles.
+    
+    Args:
+        preamble (str): LaTeX source before \\begin{document}
+        template_latex (str): Source of the template the CV was generated from
         
-        if result.returncode != 0:
-            logger.error(f'pdflatex compilation failed: {result.stderr}')
-            return None, None
+    Returns:
+        threading.Thread: The running build, or None if there is nothing to build
+    """
+    if not PDFLATEX_PATH:
+        return None
+    
+    static_preamble, _ = _split_preamble(preamble)
+    name = _format_name(static_preamble)
+    template_preamble = template_latex.partition('\\begin{document}')[0]
+    if name != _format_name(_split_preamble(template_preamble)[0]):
+        return None
+    if name in _failed_formats or os.path.exists(os.path.join(FORMAT_CACHE_DIR, f'{name}.fmt')):
+        return None
+    
+    thread = threading.Thread(target=_build_format, args=(name, static_preamble), daemon=True)
+    thread.start()
+    return thread
+
+
+def _pdflatex_passes(output_dir, resolve_references, preamble_format=None):
+    """
+    Build the pdflatex command lines to run for a CV directory.
+    
+    Sources with cross-references get a -draftmode pass first, which
+    writes the .aux file without the costly PDF output, then the final
+    pass; everything else compiles in a single pass.
+    
+    Args:
+        output_dir (str): Directory pdflatex writes its output to
+        resolve_references (bool): Whether a reference pass is needed
+        preamble_format (str): Format from _preamble_format, if any
+        
+    Returns:
+        list: Command lines, in run order
+    """
+    final = [
+        PDFLATEX_PATH,
+        '-interaction=nonstopmode',
+        '-output-directory', output_dir,
+        'cv.tex'
+    ]
+    if preamble_format:
+        final[1:1] = [f'-fmt={preamble_format}']
+    
+    if not resolve_references:
+        return [final]
+    
+    draft = final[:1] + ['-draftmode'] + final[1:]
+    return [draft, final]
+
+
+def _check_pdflatex_result(returncode, stderr, scratch_dir, user_dir):
+    """
+    Check a finished pdflatex run and move its PDF into the CV directory.
+    
+    Args:
+        returncode (int): pdflatex exit status
+        stderr (bytes): pdflatex error output, decoded only if logged
+        scratch_dir (str): Directory pdflatex wrote its output to
+        user_dir (str): Directory containing LaTeX files
+        
+    Returns:
+        str: PDF path, or None if compilation failed
+    """
+    scratch_pdf = os.path.join(scratch_dir, 'cv.pdf')
+    
+    if returncode != 0:
+        logger.error(f"pdflatex compilation failed: {stderr.decode('utf-8', errors='replace')}")
+        return None
+    
+    if not os.path.exists(scratch_pdf):
+        logger.error('PDF file was not created despite successful compilation')
+        return None
+    
+    # shutil.move, not os.replace: tmpfs is usually a different filesystem
+    pdf_path = os.path.join(user_dir, 'cv.pdf')
+    shutil.move(scratch_pdf, pdf_path)
+    return pdf_path
+
+
+def _restore_aux(user_dir, scratch_dir):
+    """
+    Copy the CV's kept .aux file into a compile's scratch directory.
+    
+    Args:
+        user_dir (str): CV directory
+        scratch_dir (str): Scratch directory for this compile
         
-        if not os.path.exists(pdf_path):
-            logger.error('PDF file was not created despite successful compilation')
+    Returns:
+        bool: True if an .aux file from an earlier compile was restored
+    """
+    try:
+        shutil.copyfile(os.path.join(user_dir, AUX_FILE), os.path.join(scratch_dir, AUX_FILE))
+        return True
+    except OSError:
+        return False
+
+
+def _keep_aux(scratch_dir, user_dir):
+    """Keep a successful compile's .aux file for the CV's next compile."""
+    try:
+        shutil.move(os.path.join(scratch_dir, AUX_FILE), os.path.join(user_dir, AUX_FILE))
+    except OSError as e:
+        logger.debug(f'Could not keep .aux file: {str(e)}')
+
+
+def _discard_aux(user_dir):
+    """Remove a CV's kept .aux file, e.g. after it broke a compile."""
+    try:
+        os.remove(os.path.join(user_dir, AUX_FILE))
+    except OSError:
+        pass
+
+
+def _references_changed(scratch_dir):
+    """
+    Check whether a pass found references that differ from its .aux input.
+    
+    Args:
+        scratch_dir (str): Scratch directory holding the pass's cv.log
+        
+    Returns:
+        bool: True if pdflatex asked for another pass
+    """
+    try:
+        with open(os.path.join(scratch_dir, 'cv.log'), 'rb') as f:
+            return _RERUN_MARKER in f.read()
+    except OSError:
+        return True
+
+
+def _make_scratch_dir():
+    """
+    Create a scratch directory for one pdflatex compile.
+    
+    pdflatex writes .aux/.log/.out files on every pass; keeping them on
+    tmpfs avoids disk I/O, and removing the directory afterwards leaves no
+    by-products in the CV directory other than the kept .aux file.
+    
+    Returns:
+        str: Scratch directory path
+    """
+    return tempfile.mkdtemp(prefix='cv_', dir=SCRATCH_ROOT)
+
+
+def _compile_with_pdflatex(user_dir, user_tier, cv_uuid, resolve_references=False,
+                           preamble_format=None):
+    """
+    Compile LaTeX using pdflatex system command.
+    
+    Args:
+        user_dir (str): Directory containing LaTeX files
+        user_tier (str): User subscription tier
+        cv_uuid (str): CV UUID
+        resolve_references (bool): Resolve cross-references, with a
+            -draftmode pass first unless the CV's kept .aux is available
+        preamble_format (str): Precompiled preamble format to load
+        
+    Returns:
+        tuple: (pdf_path, jpg_path) or (None, None) if failed
+    """
+    if not _pdflatex_available():
+        return None, None
+    
+    scratch_dir = _make_scratch_dir()
+    try:
+        aux_reused = resolve_references and _restore_aux(user_dir, scratch_dir)
+        while True:
+            passes = _pdflatex_passes(
+                scratch_dir, resolve_references and not aux_reused, preamble_format
+            )
+            # A kept .aux only needs the final pass again if references moved
+            if aux_reused:
+                passes.append(None)
+            
+            # Run compilation with timeout, stopping at the first failed pass
+            for cmd in passes:
+                if cmd is None:
+                    if not _references_changed(scratch_dir):
+                        break
+                    cmd = passes[0]
+                result = subprocess.run(
+                    cmd,
+                    cwd=user_dir, 
+                    env=_PDFLATEX_ENV,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                    timeout=PDFLATEX_TIMEOUT
+                )
+                if result.returncode != 0:
+                    break
+            
+            if result.returncode == 0 or not aux_reused:
+                break
+            
+            # A stale .aux (e.g. from a version that loaded a package since
+            # removed) can break the final pass; drop it and compile once
+            # more from a clean scratch directory
+            logger.warning(f'pdflatex failed with the kept .aux for CV {cv_uuid}; retrying without it')
+            _discard_aux(user_dir)
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+            scratch_dir = _make_scratch_dir()
+            aux_reused = False
+        
+        pdf_path = _check_pdflatex_result(result.returncode, result.stderr, scratch_dir, user_dir)
+        if not pdf_path:
             return None, None
+        if resolve_references:
+            _keep_aux(scratch_dir, user_dir)
         
         # Create JPG preview for free users
         jpg_path = None
@@ -118,12 +580,16 @@ def _compile_with_pdflatex(user_dir, user_tier, cv_uuid):
     except Exception as e:
         logger.error(f'pdflatex compilation error: {str(e)}')
         return None, None
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
 
 
 def _create_jpg_preview(pdf_path, user_dir):
     """
     Create JPG preview from PDF first page.
     
+    An existing preview at least as new as the PDF is reused as-is.
+    
     Args:
         pdf_path (str): Path to PDF file
         user_dir (str): User directory
@@ -134,24 +600,28 @@ def _create_jpg_preview(pdf_path, user_dir):
     try:
         jpg_path = os.path.join(user_dir, 'cv.jpg')
         
-        # Use PyMuPDF to convert PDF to image
-        doc = fitz.open(pdf_path)
-        page = doc.load_page(0)  # first page
-        
-        # Render page to image with high quality
-        mat = fitz.Matrix(2.0, 2.0)  # 2x zoom for better quality
-        pix = page.get_pixmap(matrix=mat)
-        
-        # Convert to PIL Image and save as JPG
-        img_data = pix.tobytes("ppm")
-        img = Image.open(BytesIO(img_data))
-        
-        # Resize if too large
-        if img.width > 1200 or img.height > 1600:
-            img.thumbnail((1200, 1600), Image.Resampling.LANCZOS)
-        
-        img.save(jpg_path, 'JPEG', quality=85, optimize=True)
-        doc.close()
+        try:
+            if os.path.getmtime(jpg_path) >= os.path.getmtime(pdf_path):
+                return jpg_path
+        except OSError:
+            pass  # No preview yet
+        
+        # Render the first page straight to the preview size and let
+        # PyMuPDF encode the JPEG, skipping a decode/resize pass through PIL
+        with fitz.open(pdf_path) as doc:
+            page = doc.load_page(0)  # first page
+            zoom = min(
+                PREVIEW_MAX_WIDTH / page.rect.width,
+                PREVIEW_MAX_HEIGHT / page.rect.height,
+                2.0
+            )
+            pix = page.get_pixmap(
+                matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False
+            )
+            jpeg_data = pix.tobytes("jpeg", jpg_quality=85)
+        
+        with open(jpg_path, 'wb') as f:
+            f.write(jpeg_data)
         
         logger.info(f'Created JPG preview: {jpg_path}')
         return jpg_path
@@ -181,7 +651,7 @@ def _create_fallback_pdf(user_dir, latex_code, user_tier, cv_uuid):
         cv_content = _extract_content_from_latex(latex_code)
         
         # Create PDF using reportlab
-        c = canvas.Canvas(pdf_path, pagesize=A4)
+        c = canvas.Canvas(pdf_path, pagesize=A4, pageCompression=1)
         width, height = A4
         
         # Set up fonts and spacing
@@ -198,57 +668,39 @@ def _create_fallback_pdf(user_dir, latex_code, user_tier, cv_uuid):
             y_position -= 40
         
         # Contact information
-        c.setFont(body_font, 12)
-        contact_info = []
-        if cv_content.get('email'):
-            contact_info.append(f"Email: {cv_content['email']}")
-        if cv_content.get('phone'):
-            contact_info.append(f"Phone: {cv_content['phone']}")
-        
+        contact_info = [
+            f"{label}: {cv_content[key]}"
+            for label, key in (('Email', 'email'), ('Phone', 'phone'))
+            if cv_content.get(key)
+        ]
         if contact_info:
+            c.setFont(body_font, 12)
             c.drawString(50, y_position, " | ".join(contact_info))
             y_position -= 30
         
-        # Professional Summary
-        if cv_content.get('summary'):
-            c.setFont(header_font, 14)
-            c.drawString(50, y_position, "Professional Summary")
-            y_position -= 20
-            
-            c.setFont(body_font, 11)
-            _draw_wrapped_text(c, cv_content['summary'], 50, y_position, width - 100)
-            y_position -= 60
-        
-        # Experience
-        if cv_content.get('experience'):
-            c.setFont(header_font, 14)
-            c.drawString(50, y_position, "Experience")
-            y_position -= 20
-            
-            c.setFont(body_font, 11)
-            _draw_wrapped_text(c, cv_content['experience'], 50, y_position, width - 100)
-            y_position -= 60
+        # Sections, skipping any the source didn't have
+        skills = cv_content.get('skills')
+        if skills and not isinstance(skills, str):
+            skills = ', '.join(skills)
+        sections = [
+            (heading, text) for heading, text in (
+                ("Professional Summary", cv_content.get('summary')),
+                ("Experience", cv_content.get('experience')),
+                ("Skills", skills),
+                ("Education", cv_content.get('education'))
+            )
+            if text
+        ]
         
-        # Skills
-        if cv_content.get('skills'):
+        for heading, text in sections:
             c.setFont(header_font, 14)
-            c.drawString(50, y_position, "Skills")
+            c.drawString(50, y_position, heading)
             y_position -= 20
             
             c.setFont(body_font, 11)
-            skills_text = cv_content['skills'] if isinstance(cv_content['skills'], str) else ', '.join(cv_content['skills'])
-            _draw_wrapped_text(c, skills_text, 50, y_position, width - 100)
+            _draw_wrapped_text(c, text, 50, y_position, width - 100)
             y_position -= 60
         
-        # Education
-        if cv_content.get('education'):
-            c.setFont(header_font, 14)
-            c.drawString(50, y_position, "Education")
-            y_position -= 20
-            
-            c.setFont(body_font, 11)
-            _draw_wrapped_text(c, cv_content['education'], 50, y_position, width - 100)
-        
         # Add watermark for fallback
         c.setFont("Helvetica", 8)
         c.setFillGray(0.7)
@@ -282,47 +734,36 @@ def _extract_content_from_latex(latex_code):
     content = {}
     
     try:
-        # Simple regex-based extraction
-        import re
-        
         # Extract name (look for common patterns)
-        name_patterns = [
-            r'\\name\{([^}]+)\}',
-            r'\\textbf\{([^}]+)\}.*(?:CV|Resume)',
-            r'\\LARGE\s*\\textbf\{([^}]+)\}',
-            r'\\huge\s*([^\\]+)'
-        ]
-        
-        for pattern in name_patterns:
-            match = re.search(pattern, latex_code, re.IGNORECASE)
+        for pattern in _NAME_PATTERNS:
+            match = pattern.search(latex_code)
             if match:
                 content['name'] = match.group(1).strip()
                 break
         
         # Extract email
-        email_match = re.search(r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})', latex_code)
+        email_match = _EMAIL_RE.search(latex_code)
         if email_match:
             content['email'] = email_match.group(1)
         
         # Extract phone (basic pattern)
-        phone_match = re.search(r'(\+?[\d\s\-\(\)]{10,})', latex_code)
+        phone_match = _PHONE_RE.search(latex_code)
         if phone_match:
             content['phone'] = phone_match.group(1).strip()
         
-        # Extract sections
-        sections = ['summary', 'experience', 'skills', 'education']
-        for section in sections:
-            pattern = rf'\\section\*?\{{[^}}]*{section}[^}}]*\}}(.*?)(?=\\section|\Z)'
-            match = re.search(pattern, latex_code, re.IGNORECASE | re.DOTALL)
-            if match:
-                # Clean up LaTeX commands
-                text = match.group(1)
-                text = re.sub(r'\\[a-zA-Z]+\{([^}]*)\}', r'\1', text)
-                text = re.sub(r'\\[a-zA-Z]+', '', text)
-                text = re.sub(r'\{|\}', '', text)
-                text = re.sub(r'\s+', ' ', text).strip()
+        # Extract sections; the first header naming a section wins
+        seen = set()
+        for match in _SECTION_RE.finditer(latex_code):
+            title = match.group(1).lower()
+            for section in _SECTION_KEYS:
+                if section in seen or section not in title:
+                    continue
+                seen.add(section)
+                text = _clean_latex_text(match.group(2))
                 if text:
                     content[section] = text
+            if len(seen) == len(_SECTION_KEYS):
+                break
         
         return content
         
@@ -331,6 +772,14 @@ def _extract_content_from_latex(latex_code):
         return {'name': 'CV Generated by MorphCV'}
 
 
+def _clean_latex_text(text):
+    """Strip LaTeX commands and braces from a section body and collapse whitespace."""
+    text = _COMMAND_WITH_ARG_RE.sub(r'\1', text)
+    text = _COMMAND_RE.sub('', text)
+    text = _BRACE_RE.sub('', text)
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
 def _draw_wrapped_text(canvas_obj, text, x, y, max_width):
     """
     Draw text with word wrapping.
@@ -346,15 +795,25 @@ def _draw_wrapped_text(canvas_obj, text, x, y, max_width):
         words = text.split()
         lines = []
         current_line = []
+        current_width = 0
+        
+        # Measure each word once and keep a running line width instead of
+        # re-measuring the whole line for every word
+        font_name, font_size = canvas_obj._fontname, canvas_obj._fontsize
+        space_width = canvas_obj.stringWidth(' ', font_name, font_size)
         
         for word in words:
-            test_line = ' '.join(current_line + [word])
-            if canvas_obj.stringWidth(test_line) <= max_width:
+            word_width = canvas_obj.stringWidth(word, font_name, font_size)
+            line_width = current_width + space_width + word_width if current_line else word_width
+            
+            if line_width <= max_width:
                 current_line.append(word)
+                current_width = line_width
             else:
                 if current_line:
                     lines.append(' '.join(current_line))
                     current_line = [word]
+                    current_width = word_width
                 else:
                     lines.append(word)  # Word is too long, add anyway
         
@@ -369,6 +828,25 @@ def _draw_wrapped_text(canvas_obj, text, x, y, max_width):
         canvas_obj.drawString(x, y, text[:100] + '...' if len(text) > 100 else text)
 
 
+@lru_cache(maxsize=1)
+def _placeholder_fonts():
+    """
+    Load the placeholder JPG fonts once per process.
+    
+    Returns:
+        tuple: (font_large, font_small)
+    """
+    try:
+        # Try to use a better font
+        font_large = ImageFont.truetype("/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf", 36)
+        font_small = ImageFont.truetype("/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf", 18)
+    except OSError:
+        # Fallback to default font
+        font_large = ImageFont.load_default()
+        font_small = ImageFont.load_default()
+    return font_large, font_small
+
+
 def _create_dummy_files(user_dir, user_tier, cv_uuid):
     """
     Create dummy files as last resort when all other methods fail.
@@ -385,7 +863,7 @@ def _create_dummy_files(user_dir, user_tier, cv_uuid):
         # Create simple PDF using reportlab
         pdf_path = os.path.join(user_dir, 'cv.pdf')
         
-        c = canvas.Canvas(pdf_path, pagesize=A4)
+        c = canvas.Canvas(pdf_path, pagesize=A4, pageCompression=1)
         width, height = A4
         
         # Simple placeholder content
@@ -407,18 +885,12 @@ def _create_dummy_files(user_dir, user_tier, cv_uuid):
         if user_tier == 'free':
             jpg_path = os.path.join(user_dir, 'cv.jpg')
             
-            # Create simple image using PIL
-            img = Image.new('RGB', (600, 800), color='white')
+            # Create simple greyscale image using PIL (the placeholder has
+            # no colour, so one channel is enough)
+            img = Image.new('L', (600, 800), color='white')
             draw = ImageDraw.Draw(img)
             
-            try:
-                # Try to use a better font
-                font_large = ImageFont.truetype("/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf", 36)
-                font_small = ImageFont.truetype("/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf", 18)
-            except:
-                # Fallback to default font
-                font_large = ImageFont.load_default()
-                font_small = ImageFont.load_default()
+            font_large, font_small = _placeholder_fonts()
             
             draw.text((50, 100), "CV Generation", fill='black', font=font_large)
             draw.text((50, 200), "Your CV is being processed", fill='black', font=font_small)
@@ -427,7 +899,7 @@ def _create_dummy_files(user_dir, user_tier, cv_uuid):
             
             draw.text((50, 700), f"CV ID: {cv_uuid[:8]}", fill='gray', font=font_small)
             
-            img.save(jpg_path, 'JPEG', quality=80)
+            img.save(jpg_path, 'JPEG', quality=80, optimize=True, progressive=True)
         
         logger.info(f'Created dummy files for CV {cv_uuid}')
         return pdf_path, jpg_path
@@ -445,13 +917,18 @@ def cleanup_temp_files(user_dir):
         user_dir (str): User directory path
     """
     try:
-        temp_extensions = ['.aux', '.log', '.out', '.fdb_latexmk', '.fls', '.synctex.gz']
-        
-        for file in os.listdir(user_dir):
-            if any(file.endswith(ext) for ext in temp_extensions):
-                file_path = os.path.join(user_dir, file)
-                os.remove(file_path)
-                logger.debug(f'Cleaned up temp file: {file_path}')
+        removed = 0
+        
+        with os.scandir(user_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(TEMP_FILE_EXTENSIONS) and entry.is_file():
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except OSError:
+                        pass  # Already gone or locked; keep cleaning the rest
+        
+        logger.debug(f'Cleaned up {removed} temp files in {user_dir}')
                 
     except Exception as e:
         logger.warning(f'Failed to cleanup temp files: {str(e)}')
@@ -461,8 +938,11 @@ def validate_latex_code(latex_code):
     """
     Validate LaTeX code for basic syntax errors.
     
+    Callers already holding the encoded source can pass bytes; the scans
+    then run over the bytes directly instead of a decoded copy.
+    
     Args:
-        latex_code (str): LaTeX source code
+        latex_code (str or bytes): LaTeX source code (bytes as UTF-8)
         
     Returns:
         tuple: (is_valid, error_messages)
@@ -474,28 +954,39 @@ def validate_latex_code(latex_code):
             errors.append("LaTeX code is empty")
             return False, errors
         
+        if len(latex_code) > MAX_LATEX_LENGTH:
+            errors.append(f"LaTeX code is too large (over {MAX_LATEX_LENGTH} characters)")
+            return False, errors
+        
+        # Find every structural and dangerous token in one scan, and count
+        # braces (both are ASCII, so bytes and str give the same counts)
+        if isinstance(latex_code, (bytes, bytearray)):
+            found = {token.decode('ascii') for token in _VALIDATION_TOKEN_BYTES_RE.findall(latex_code)}
+            open_braces = latex_code.count(b'{')
+            close_braces = latex_code.count(b'}')
+        else:
+            found = set(_VALIDATION_TOKEN_RE.findall(latex_code))
+            open_braces = latex_code.count('{')
+            close_braces = latex_code.count('}')
+        
         # Check for document class
-        if '\\documentclass' not in latex_code:
+        if '\\documentclass' not in found:
             errors.append("Missing \\documentclass declaration")
         
         # Check for document environment
-        if '\\begin{document}' not in latex_code:
+        if '\\begin{document}' not in found:
             errors.append("Missing \\begin{document}")
         
-        if '\\end{document}' not in latex_code:
+        if '\\end{document}' not in found:
             errors.append("Missing \\end{document}")
         
         # Check for balanced braces
-        open_braces = latex_code.count('{')
-        close_braces = latex_code.count('}')
-        
         if open_braces != close_braces:
             errors.append(f"Unbalanced braces: {open_braces} opening, {close_braces} closing")
         
         # Check for dangerous commands (security)
-        dangerous_commands = ['\\write18', '\\input', '\\include', '\\openin', '\\openout']
-        for cmd in dangerous_commands:
-            if cmd in latex_code:
+        for cmd in DANGEROUS_COMMANDS:
+            if cmd in found:
                 errors.append(f"Potentially dangerous command detected: {cmd}")
         
         return len(errors) == 0, errors
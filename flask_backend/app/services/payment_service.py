@@ -1,18 +1,122 @@
+import json
+import hashlib
 import stripe
 import logging
+from functools import lru_cache
+from types import MappingProxyType
 from datetime import datetime, timezone
 from flask import current_app
+from sqlalchemy import or_, update
 from app.models import db, User, UserTier
+from app.utils.redis_client import (
+    get_redis, get_durable_redis, cache_get_json, cache_set_json, cache_delete
+)
 
 logger = logging.getLogger(__name__)
 
+# Bound once for the webhook hot path (Stripe timestamps are UTC epochs)
+_UTC = timezone.utc
+_fromtimestamp = datetime.fromtimestamp
+
+# Redis key for the formatted CV generation price list
+PRICES_CACHE_KEY = 'stripe:prices:cv_generation:v1'
+
+def _url_digest(*urls):
+    """Short stable digest of redirect URLs, for session cache keys."""
+    return hashlib.blake2b('\n'.join(urls).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _checkout_cache_key(customer_id, price_id, success_url, cancel_url):
+    """Cache key for a reusable checkout session."""
+    return f'checkout:{customer_id}:{price_id}:{_url_digest(success_url, cancel_url)}'
+
+
+def _subscription_cache_key(customer_id):
+    """Cache key for a customer's formatted active subscription."""
+    return f'stripe_sub_fmt:{customer_id}'
+
+
+def _checkout_session_index_key(session_id):
+    """Key mapping a checkout session ID back to its cache key."""
+    return f'checkout:session:{session_id}'
+
+
+# Redis list buffering verified webhook events for process_webhook_queue
+WEBHOOK_QUEUE_KEY = 'stripe:webhooks'
+
+# Most webhook events applied in one batch (one user query, one commit)
+WEBHOOK_BATCH_SIZE = 100
+
+# How long processed webhook event IDs are remembered (Stripe retries for 3 days)
+WEBHOOK_DEDUPE_TTL = 7 * 24 * 3600
+
+# Lock keeping concurrent drains from applying the same events twice
+WEBHOOK_QUEUE_LOCK = 'stripe:webhooks:lock'
+
+# Redis list holding webhook events that kept failing, for manual replay
+WEBHOOK_DEAD_LETTER_KEY = 'stripe:webhooks:dead'
+
+# Failed drains an event gets before it is moved to the dead-letter list
+WEBHOOK_MAX_ATTEMPTS = 20
+
+# Tiers with unlimited generations
+PAID_TIERS = frozenset({UserTier.PRO, UserTier.ENTERPRISE})
+
+# generations_left shown for paid tiers; their counter is never decremented
+UNLIMITED_GENERATIONS = 999
+
+# Payment methods offered at checkout
+PAYMENT_METHOD_TYPES = ('card',)
+
+# Product metadata 'tier' values and the user tier each grants
+TIER_BY_NAME = MappingProxyType({
+    'pro': UserTier.PRO,
+    'enterprise': UserTier.ENTERPRISE,
+    'premium': UserTier.PRO,
+    'business': UserTier.ENTERPRISE
+})
+
+
+def _tier_from_product(product):
+    """Map a Stripe product's tier metadata to a UserTier (PRO if unknown)."""
+    tier_name = (product.get('metadata') or {}).get('tier', '').lower()
+    return TIER_BY_NAME.get(tier_name, UserTier.PRO)  # Default to PRO for paid
+
+
+@lru_cache(maxsize=256)
+def _tier_for_price_id(price_id):
+    """
+    Resolve the user tier a Stripe price grants.
+    
+    Memoized per process, since price metadata rarely changes; price and
+    product webhooks clear it through invalidate_price_cache.
+    
+    Args:
+        price_id (str): Stripe price ID
+        
+    Returns:
+        UserTier: User tier enum value
+    """
+    price = stripe.Price.retrieve(price_id, expand=['product'])
+    return _tier_from_product(price.product)
+
 
 class PaymentService:
-    """Service for handling Stripe payments and subscriptions."""
+    """
+    Service for handling Stripe payments and subscriptions.
+    
+    The API key and pooled HTTP client are set up once by configure_stripe
+    in create_app.
+    """
     
     def __init__(self):
-        """Initialize Stripe with API key."""
-        stripe.api_key = current_app.config.get('STRIPE_SECRET_KEY')
+        """Start outside batch mode (see process_webhook_batch)."""
+        # (column, value) -> User preloaded for the current webhook batch
+        self._users = None
+        # (column, value) pairs the batch preload looked for
+        self._preloaded = None
+        # Savepoint wrapping the webhook event being applied in a batch
+        self._savepoint = None
     
     def create_customer(self, email, name=None, user_id=None):
         """
@@ -38,28 +142,38 @@ class PaymentService:
             if user_id:
                 customer_data['metadata']['user_id'] = str(user_id)
             
-            customer = stripe.Customer.create(**customer_data)
+            # One customer per user: a retried create returns the first one
+            idempotency_key = f'user:{user_id}:customer-create' if user_id else None
+            customer = stripe.Customer.create(idempotency_key=idempotency_key, **customer_data)
             
-            logger.info(f'Created Stripe customer {customer.id} for email {email}')
+            logger.info('Created Stripe customer %s for email %s', customer.id, email)
             return customer
             
         except stripe.error.StripeError as e:
-            logger.error(f'Stripe error creating customer: {str(e)}')
+            logger.error('Stripe error creating customer: %s', e)
             return None
         except Exception as e:
-            logger.error(f'Error creating customer: {str(e)}')
+            logger.error('Error creating customer: %s', e)
             return None
     
     def get_customer_subscription(self, customer_id):
         """
         Get customer's active subscription.
         
+        Cached per customer for STRIPE_SUBSCRIPTION_CACHE_TTL seconds; the
+        subscription webhooks and cancel/reactivate drop the entry.
+        
         Args:
             customer_id (str): Stripe customer ID
             
         Returns:
             dict: Subscription details or None if no active subscription
         """
+        cache_key = _subscription_cache_key(customer_id)
+        cached = cache_get_json(cache_key)
+        if cached is not None:
+            return cached['subscription']
+        
         try:
             subscriptions = stripe.Subscription.list(
                 customer=customer_id,
@@ -67,16 +181,17 @@ class PaymentService:
                 limit=1
             )
             
+            details = None
             if subscriptions.data:
                 subscription = subscriptions.data[0]
-                return {
+                details = {
                     'id': subscription.id,
                     'status': subscription.status,
-                    'current_period_start': datetime.fromtimestamp(
-                        subscription.current_period_start, timezone.utc
+                    'current_period_start': _fromtimestamp(
+                        subscription.current_period_start, _UTC
                     ).isoformat(),
-                    'current_period_end': datetime.fromtimestamp(
-                        subscription.current_period_end, timezone.utc
+                    'current_period_end': _fromtimestamp(
+                        subscription.current_period_end, _UTC
                     ).isoformat(),
                     'cancel_at_period_end': subscription.cancel_at_period_end,
                     'plan_name': subscription.items.data[0].price.nickname,
@@ -85,13 +200,18 @@ class PaymentService:
                     'interval': subscription.items.data[0].price.recurring.interval
                 }
             
-            return None
+            # Wrapped so "no active subscription" is cached too
+            cache_set_json(
+                cache_key, {'subscription': details},
+                current_app.config.get('STRIPE_SUBSCRIPTION_CACHE_TTL', 300)
+            )
+            return details
             
         except stripe.error.StripeError as e:
-            logger.error(f'Stripe error getting subscription: {str(e)}')
+            logger.error('Stripe error getting subscription: %s', e)
             return None
         except Exception as e:
-            logger.error(f'Error getting subscription: {str(e)}')
+            logger.error('Error getting subscription: %s', e)
             return None
     
     def create_checkout_session(self, customer_id, price_id, success_url, cancel_url, user_id=None):
@@ -108,10 +228,18 @@ class PaymentService:
         Returns:
             dict: Checkout session object or None if failed
         """
+        # A refresh or back-button within the TTL gets the same session
+        ttl = current_app.config.get('STRIPE_CHECKOUT_CACHE_TTL', 0)
+        cache_key = _checkout_cache_key(customer_id, price_id, success_url, cancel_url)
+        if ttl:
+            cached = cache_get_json(cache_key)
+            if cached is not None:
+                return cached
+        
         try:
             session_data = {
                 'customer': customer_id,
-                'payment_method_types': ['card'],
+                'payment_method_types': PAYMENT_METHOD_TYPES,
                 'line_items': [{
                     'price': price_id,
                     'quantity': 1,
@@ -127,14 +255,22 @@ class PaymentService:
             
             session = stripe.checkout.Session.create(**session_data)
             
-            logger.info(f'Created checkout session {session.id} for customer {customer_id}')
+            if ttl:
+                cache_set_json(cache_key, {
+                    'id': session['id'],
+                    'url': session['url'],
+                    'expires_at': session['expires_at']
+                }, ttl)
+                cache_set_json(_checkout_session_index_key(session['id']), cache_key, ttl)
+            
+            logger.info('Created checkout session %s for customer %s', session.id, customer_id)
             return session
             
         except stripe.error.StripeError as e:
-            logger.error(f'Stripe error creating checkout session: {str(e)}')
+            logger.error('Stripe error creating checkout session: %s', e)
             return None
         except Exception as e:
-            logger.error(f'Error creating checkout session: {str(e)}')
+            logger.error('Error creating checkout session: %s', e)
             return None
     
     def create_customer_portal_session(self, customer_id, return_url):
@@ -148,45 +284,64 @@ class PaymentService:
         Returns:
             dict: Portal session object or None if failed
         """
+        ttl = current_app.config.get('STRIPE_PORTAL_CACHE_TTL', 0)
+        cache_key = f'portal:{customer_id}:{_url_digest(return_url)}'
+        if ttl:
+            cached = cache_get_json(cache_key)
+            if cached is not None:
+                return cached
+        
         try:
             session = stripe.billing_portal.Session.create(
                 customer=customer_id,
                 return_url=return_url,
             )
             
-            logger.info(f'Created customer portal session for customer {customer_id}')
+            if ttl:
+                cache_set_json(cache_key, {'id': session['id'], 'url': session['url']}, ttl)
+            
+            logger.info('Created customer portal session for customer %s', customer_id)
             return session
             
         except stripe.error.StripeError as e:
-            logger.error(f'Stripe error creating portal session: {str(e)}')
+            logger.error('Stripe error creating portal session: %s', e)
             return None
         except Exception as e:
-            logger.error(f'Error creating portal session: {str(e)}')
+            logger.error('Error creating portal session: %s', e)
             return None
     
     def get_subscription_prices(self):
         """
         Get available subscription prices from Stripe.
         
+        The formatted list is cached in Redis for STRIPE_PRICES_TTL seconds;
+        price and product webhooks clear it via invalidate_price_cache.
+        
         Returns:
             list: List of available prices or None if failed
         """
+        cached = cache_get_json(PRICES_CACHE_KEY)
+        if cached is not None:
+            return cached
+        
         try:
+            # Expand products inline rather than retrieving each one
             prices = stripe.Price.list(
                 active=True,
                 type='recurring',
-                limit=20
+                limit=20,
+                expand=['data.product']
             )
             
             formatted_prices = []
             for price in prices.data:
                 # Only include prices with products that have metadata indicating they're for CV generation
                 try:
-                    product = stripe.Product.retrieve(price.product)
+                    product = price.product
                     if product.metadata.get('service_type') == 'cv_generation':
                         formatted_prices.append({
                             'id': price.id,
-                            'product_id': price.product,
+                            'product_id': product.id,
                             'product_name': product.name,
                             'product_description': product.description,
                             'amount': price.unit_amount,
@@ -197,22 +352,50 @@ class PaymentService:
                             'tier': product.metadata.get('tier', 'unknown')
                         })
                 except Exception as e:
-                    logger.warning(f'Error processing price {price.id}: {str(e)}')
+                    logger.warning('Error processing price %s: %s', price.id, e)
                     continue
             
             # Sort by amount
             formatted_prices.sort(key=lambda x: x['amount'])
             
-            logger.info(f'Retrieved {len(formatted_prices)} subscription prices')
+            logger.info('Retrieved %s subscription prices', len(formatted_prices))
+            cache_set_json(
+                PRICES_CACHE_KEY, formatted_prices,
+                current_app.config.get('STRIPE_PRICES_TTL', 21600)
+            )
             return formatted_prices
             
         except stripe.error.StripeError as e:
-            logger.error(f'Stripe error getting prices: {str(e)}')
+            logger.error('Stripe error getting prices: %s', e)
             return None
         except Exception as e:
-            logger.error(f'Error getting prices: {str(e)}')
+            logger.error('Error getting prices: %s', e)
             return None
     
+    def invalidate_price_cache(self):
+        """Drop the cached price list so the next request refetches it from Stripe."""
+        cache_delete(PRICES_CACHE_KEY)
+        _tier_for_price_id.cache_clear()
+        logger.info('Invalidated subscription price cache')
+    
+    def invalidate_subscription_cache(self, customer_id):
+        """Drop a customer's cached subscription details."""
+        if customer_id:
+            cache_delete(_subscription_cache_key(customer_id))
+    
+    def evict_checkout_session(self, session_data):
+        """
+        Stop reusing a checkout session once it has completed or expired.
+        
+        Args:
+            session_data (dict): Stripe checkout session object
+        """
+        index_key = _checkout_session_index_key(session_data['id'])
+        cache_key = cache_get_json(index_key)
+        if cache_key:
+            cache_delete(cache_key)
+        cache_delete(index_key)
+    
     def cancel_subscription(self, subscription_id, cancel_at_period_end=True, reason=None):
         """
         Cancel a subscription.
@@ -235,14 +418,15 @@ class PaymentService:
             else:
                 subscription = stripe.Subscription.delete(subscription_id)
             
-            logger.info(f'Cancelled subscription {subscription_id}')
+            self.invalidate_subscription_cache(subscription['customer'])
+            logger.info('Cancelled subscription %s', subscription_id)
             return subscription
             
         except stripe.error.StripeError as e:
-            logger.error(f'Stripe error cancelling subscription: {str(e)}')
+            logger.error('Stripe error cancelling subscription: %s', e)
             return None
         except Exception as e:
-            logger.error(f'Error cancelling subscription: {str(e)}')
+            logger.error('Error cancelling subscription: %s', e)
             return None
     
     def reactivate_subscription(self, subscription_id):
@@ -261,16 +445,272 @@ class PaymentService:
                 cancel_at_period_end=False
             )
             
-            logger.info(f'Reactivated subscription {subscription_id}')
+            self.invalidate_subscription_cache(subscription['customer'])
+            logger.info('Reactivated subscription %s', subscription_id)
             return subscription
             
         except stripe.error.StripeError as e:
-            logger.error(f'Stripe error reactivating subscription: {str(e)}')
+            logger.error('Stripe error reactivating subscription: %s', e)
             return None
         except Exception as e:
-            logger.error(f'Error reactivating subscription: {str(e)}')
+            logger.error('Error reactivating subscription: %s', e)
             return None
     
+    def handle_webhook_event(self, event_type, event_data):
+        """
+        Apply one verified Stripe webhook event.
+        
+        Args:
+            event_type (str): Stripe event type
+            event_data (dict): The event's data.object
+        """
+        if event_type.startswith('customer.subscription.'):
+            self.invalidate_subscription_cache(event_data.get('customer'))
+        
+        if event_type == 'customer.subscription.created':
+            self.handle_subscription_created(event_data)
+        elif event_type == 'customer.subscription.updated':
+            self.handle_subscription_updated(event_data)
+        elif event_type == 'customer.subscription.deleted':
+            self.handle_subscription_cancelled(event_data)
+        elif event_type == 'invoice.payment_succeeded':
+            self.handle_payment_succeeded(event_data)
+        elif event_type == 'invoice.payment_failed':
+            self.handle_payment_failed(event_data)
+        elif event_type == 'customer.created':
+            self.handle_customer_created(event_data)
+        elif event_type == 'customer.updated':
+            self.handle_customer_updated(event_data)
+        elif event_type in ('checkout.session.completed', 'checkout.session.expired'):
+            self.evict_checkout_session(event_data)
+        elif event_type.startswith(('price.', 'product.')):
+            self.invalidate_price_cache()
+        else:
+            logger.info('Unhandled webhook event type: %s', event_type)
+    
+    def claim_webhook_event(self, event_id):
+        """
+        Record a webhook event as seen, so Stripe's retries are skipped.
+        
+        Args:
+            event_id (str): Stripe event ID
+            
+        Returns:
+            bool: True if the event is new (or Redis is unavailable)
+        """
+        try:
+            return bool(get_durable_redis().set(
+                f'webhook:{event_id}', 1, ex=WEBHOOK_DEDUPE_TTL, nx=True
+            ))
+        except Exception as e:
+            logger.warning('Webhook dedupe check failed for %s: %s', event_id, e)
+            return True
+    
+    def release_webhook_event(self, event_id):
+        """
+        Forget a claimed webhook event, so Stripe's retry is applied.
+        
+        Args:
+            event_id (str): Stripe event ID
+        """
+        try:
+            get_durable_redis().delete(f'webhook:{event_id}')
+        except Exception as e:
+            logger.warning('Failed to release webhook event %s: %s', event_id, e)
+    
+    def queue_webhook_event(self, event):
+        """
+        Buffer a verified webhook event for batched processing.
+        
+        Args:
+            event (dict): Verified Stripe event
+            
+        Returns:
+            bool: True if queued; False if the caller should apply it inline
+        """
+        try:
+            get_durable_redis().rpush(WEBHOOK_QUEUE_KEY, json.dumps({
+                'id': event['id'],
+                'type': event['type'],
+                'data': event['data']['object']
+            }))
+            return True
+        except Exception as e:
+            logger.warning('Failed to queue webhook event %s: %s', event.get('id'), e)
+            return False
+    
+    def process_webhook_queue(self):
+        """
+        Apply the next batch of queued webhook events.
+        
+        Events are removed from the queue only after their batch commits, so
+        a crashed drain leaves them to be picked up again. If the batch
+        fails, its events are applied one at a time; the ones that still
+        fail go to the back of the queue, and after WEBHOOK_MAX_ATTEMPTS
+        failed drains to the dead-letter list, so one bad event can't
+        block the rest.
+        
+        Returns:
+            int: Number of events applied, or 0 if any failed (so the
+                caller waits for the next run before draining again)
+        """
+        redis_client = get_durable_redis()
+        lock = redis_client.lock(WEBHOOK_QUEUE_LOCK, timeout=60)
+        if not lock.acquire(blocking=False):
+            return 0
+        
+        try:
+            raw_events = redis_client.lrange(WEBHOOK_QUEUE_KEY, 0, WEBHOOK_BATCH_SIZE - 1)
+            if not raw_events:
+                return 0
+            
+            events = [json.loads(raw) for raw in raw_events]
+            try:
+                self.process_webhook_batch(events)
+                failed = []
+            except Exception as e:
+                logger.warning('Webhook batch of %s failed, applying one by one: %s', len(events), e)
+                failed = [event for event in events if not self._apply_webhook_alone(event)]
+            
+            # Trim and requeue together; events pushed meanwhile are kept
+            pipe = redis_client.pipeline()
+            pipe.ltrim(WEBHOOK_QUEUE_KEY, len(raw_events), -1)
+            for event in failed:
+                self._requeue_failed_webhook(pipe, event)
+            pipe.execute()
+            
+            return 0 if failed else len(raw_events)
+        finally:
+            lock.release()
+    
+    def _apply_webhook_alone(self, event):
+        """Apply one queued webhook event; returns False if it failed."""
+        try:
+            self.process_webhook_batch([event])
+            return True
+        except Exception as e:
+            logger.error('Webhook event %s failed: %s', event['id'], e)
+            return False
+    
+    def _requeue_failed_webhook(self, pipe, event):
+        """Queue a failed webhook event for retry, or dead-letter it."""
+        attempts = event.get('attempts', 0) + 1
+        if attempts >= WEBHOOK_MAX_ATTEMPTS:
+            logger.error(
+                'Webhook event %s failed %s times, moved to %s',
+                event['id'], attempts, WEBHOOK_DEAD_LETTER_KEY
+            )
+            pipe.rpush(WEBHOOK_DEAD_LETTER_KEY, json.dumps(event))
+        else:
+            pipe.rpush(WEBHOOK_QUEUE_KEY, json.dumps(dict(event, attempts=attempts)))
+    
+    def process_webhook_batch(self, events):
+        """
+        Apply several webhook events with one user query and one commit.
+        
+        Every user the events refer to is loaded up front; each event then
+        runs in its own savepoint, so a failing event is rolled back alone.
+        
+        Args:
+            events (list): Dicts with 'id', 'type' and 'data' keys
+        """
+        customer_ids, subscription_ids, emails = set(), set(), set()
+        for event in events:
+            data = event['data']
+            if event['type'].startswith('customer.subscription.'):
+                subscription_ids.add(data.get('id'))
+            elif event['type'].startswith('customer.'):
+                customer_ids.add(data.get('id'))
+                emails.add(data.get('email'))
+            customer_ids.add(data.get('customer'))
+            subscription_ids.add(data.get('subscription'))
+        
+        lookups = {
+            column: values - {None} for column, values in (
+                ('stripe_customer_id', customer_ids),
+                ('subscription_id', subscription_ids),
+                ('email', emails)
+            )
+        }
+        filters = [
+            getattr(User, column).in_(values)
+            for column, values in lookups.items() if values
+        ]
+        
+        self._users = {}
+        self._preloaded = {
+            (column, value) for column, values in lookups.items() for value in values
+        }
+        try:
+            for user in (User.query.filter(or_(*filters)).all() if filters else []):
+                self._remember_user(user)
+            
+            for event in events:
+                self._savepoint = db.session.begin_nested()
+                self.handle_webhook_event(event['type'], event['data'])
+                if self._savepoint.is_active:
+                    self._savepoint.commit()
+            
+            db.session.commit()
+            logger.info('Applied %s webhook events', len(events))
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            self._users = None
+            self._preloaded = None
+            self._savepoint = None
+    
+    def _find_user(self, **criteria):
+        """
+        Find a user by a single column, using the batch preload if any.
+        
+        In a batch, users are matched on their current attributes, so
+        changes made by earlier events count; the database is only queried
+        for values the preload did not cover.
+        """
+        (column, value), = criteria.items()
+        if self._users is None:
+            return User.query.filter_by(**criteria).first()
+        
+        user = self._users.get((column, value))
+        if user is not None and getattr(user, column) == value:
+            return user
+        
+        # The column may have been set on a batch user by an earlier event
+        for user in set(self._users.values()):
+            if getattr(user, column) == value:
+                return user
+        
+        if (column, value) in self._preloaded:
+            return None  # The preload showed there is no such user
+        
+        user = User.query.filter_by(**criteria).first()
+        if user is not None:
+            self._remember_user(user)
+        return user
+    
+    def _remember_user(self, user):
+        """Index a user for _find_user in the current batch."""
+        for column in ('stripe_customer_id', 'subscription_id', 'email'):
+            self._users[(column, getattr(user, column))] = user
+    
+    def _commit(self):
+        """Commit a handler's changes, or release its savepoint in a batch."""
+        if self._savepoint is not None:
+            if self._savepoint.is_active:
+                self._savepoint.commit()
+        else:
+            db.session.commit()
+    
+    def _rollback(self):
+        """Roll back a handler's changes, or just its savepoint in a batch."""
+        if self._savepoint is not None:
+            if self._savepoint.is_active:
+                self._savepoint.rollback()
+        else:
+            db.session.rollback()
+    
     def handle_subscription_created(self, subscription_data):
         """
         Handle subscription.created webhook event.
@@ -283,32 +723,32 @@ class PaymentService:
             subscription_id = subscription_data['id']
             
             # Find user by Stripe customer ID
-            user = User.query.filter_by(stripe_customer_id=customer_id).first()
+            user = self._find_user(stripe_customer_id=customer_id)
             if not user:
-                logger.error(f'User not found for customer {customer_id}')
+                logger.error('User not found for customer %s', customer_id)
                 return
             
             # Update user subscription info
             user.subscription_id = subscription_id
             user.subscription_status = subscription_data['status']
-            user.subscription_current_period_end = datetime.fromtimestamp(
-                subscription_data['current_period_end'], timezone.utc
+            user.subscription_current_period_end = _fromtimestamp(
+                subscription_data['current_period_end'], _UTC
             )
             
             # Update user tier based on subscription
             tier = self._get_tier_from_subscription(subscription_data)
             if tier:
                 user.user_tier = tier
-                if tier in [UserTier.PRO, UserTier.ENTERPRISE]:
-                    user.generations_left = 999  # Unlimited for paid tiers
+                if tier in PAID_TIERS:
+                    user.generations_left = UNLIMITED_GENERATIONS
             
-            db.session.commit()
+            self._commit()
             
-            logger.info(f'Updated user {user.id} with new subscription {subscription_id}')
+            logger.info('Updated user %s with new subscription %s', user.id, subscription_id)
             
         except Exception as e:
-            logger.error(f'Error handling subscription created: {str(e)}')
-            db.session.rollback()
+            logger.error('Error handling subscription created: %s', e)
+            self._rollback()
     
     def handle_subscription_updated(self, subscription_data):
         """
@@ -321,31 +761,44 @@ class PaymentService:
             subscription_id = subscription_data['id']
             
             # Find user by subscription ID
-            user = User.query.filter_by(subscription_id=subscription_id).first()
+            user = self._find_user(subscription_id=subscription_id)
             if not user:
-                logger.error(f'User not found for subscription {subscription_id}')
+                logger.error('User not found for subscription %s', subscription_id)
                 return
             
-            # Update subscription info
-            user.subscription_status = subscription_data['status']
-            user.subscription_current_period_end = datetime.fromtimestamp(
-                subscription_data['current_period_end'], timezone.utc
-            )
+            # Work out the new subscription info and tier
+            changes = {
+                'subscription_status': subscription_data['status'],
+                'subscription_current_period_end': _fromtimestamp(
+                    subscription_data['current_period_end'], _UTC
+                )
+            }
             
-            # Update tier if subscription changed
             tier = self._get_tier_from_subscription(subscription_data)
             if tier:
-                user.user_tier = tier
-                if tier in [UserTier.PRO, UserTier.ENTERPRISE]:
-                    user.generations_left = 999  # Unlimited for paid tiers
+                changes['user_tier'] = tier
+                if tier in PAID_TIERS:
+                    changes['generations_left'] = UNLIMITED_GENERATIONS
+            
+            # Only write (and commit) the fields that actually changed
+            changes = {
+                field: value for field, value in changes.items()
+                if getattr(user, field) != value
+            }
+            if not changes:
+                logger.debug('Subscription for user %s unchanged', user.id)
+                return
             
-            db.session.commit()
+            for field, value in changes.items():
+                setattr(user, field, value)
+            
+            self._commit()
             
-            logger.info(f'Updated subscription for user {user.id}')
+            logger.info('Updated subscription for user %s', user.id)
             
         except Exception as e:
-            logger.error(f'Error handling subscription updated: {str(e)}')
-            db.session.rollback()
+            logger.error('Error handling subscription updated: %s', e)
+            self._rollback()
     
     def handle_subscription_cancelled(self, subscription_data):
         """
@@ -358,9 +811,9 @@ class PaymentService:
             subscription_id = subscription_data['id']
             
             # Find user by subscription ID
-            user = User.query.filter_by(subscription_id=subscription_id).first()
+            user = self._find_user(subscription_id=subscription_id)
             if not user:
-                logger.error(f'User not found for subscription {subscription_id}')
+                logger.error('User not found for subscription %s', subscription_id)
                 return
             
             # Downgrade user to free tier
@@ -370,13 +823,13 @@ class PaymentService:
             user.subscription_current_period_end = None
             user.generations_left = 2  # Reset to free tier limit
             
-            db.session.commit()
+            self._commit()
             
-            logger.info(f'Downgraded user {user.id} to free tier after subscription cancellation')
+            logger.info('Downgraded user %s to free tier after subscription cancellation', user.id)
             
         except Exception as e:
-            logger.error(f'Error handling subscription cancelled: {str(e)}')
-            db.session.rollback()
+            logger.error('Error handling subscription cancelled: %s', e)
+            self._rollback()
     
     def handle_payment_succeeded(self, invoice_data):
         """
@@ -387,25 +840,37 @@ class PaymentService:
         """
         try:
             customer_id = invoice_data['customer']
-            subscription_id = invoice_data['subscription']
             
-            # Find user by customer ID
-            user = User.query.filter_by(stripe_customer_id=customer_id).first()
-            if not user:
-                logger.error(f'User not found for customer {customer_id}')
-                return
+            # Reset generation count for paid tiers on successful payment,
+            # in one UPDATE instead of loading the user first. Paid users are
+            # never decremented, so only rows that somehow lost the sentinel
+            # need writing. The renewed period arrives separately, with the
+            # customer.subscription.updated event
+            user_id = db.session.execute(
+                update(User)
+                .where(
+                    User.stripe_customer_id == customer_id,
+                    User.user_tier.in_(tuple(PAID_TIERS)),
+                    or_(
+                        User.generations_left.is_(None),
+                        User.generations_left != UNLIMITED_GENERATIONS
+                    )
+                )
+                .values(generations_left=UNLIMITED_GENERATIONS)
+                .returning(User.id)
+            ).scalar()
             
-            # Reset generation count for paid tiers on successful payment
-            if user.user_tier in [UserTier.PRO, UserTier.ENTERPRISE]:
-                user.generations_left = 999  # Unlimited
+            self._commit()
             
-            db.session.commit()
+            if user_id is None:
+                logger.info('No paid user needed updating for customer %s', customer_id)
+                return
             
-            logger.info(f'Processed successful payment for user {user.id}')
+            logger.info('Processed successful payment for user %s', user_id)
             
         except Exception as e:
-            logger.error(f'Error handling payment succeeded: {str(e)}')
-            db.session.rollback()
+            logger.error('Error handling payment succeeded: %s', e)
+            self._rollback()
     
     def handle_payment_failed(self, invoice_data):
         """
@@ -418,19 +883,19 @@ class PaymentService:
             customer_id = invoice_data['customer']
             
             # Find user by customer ID
-            user = User.query.filter_by(stripe_customer_id=customer_id).first()
+            user = self._find_user(stripe_customer_id=customer_id)
             if not user:
-                logger.error(f'User not found for customer {customer_id}')
+                logger.error('User not found for customer %s', customer_id)
                 return
             
             # Log the failed payment for monitoring
-            logger.warning(f'Payment failed for user {user.id}, customer {customer_id}')
+            logger.warning('Payment failed for user %s, customer %s', user.id, customer_id)
             
             # Note: Don't immediately downgrade user - Stripe will retry payments
             # and send subscription.updated/deleted events if needed
             
         except Exception as e:
-            logger.error(f'Error handling payment failed: {str(e)}')
+            logger.error('Error handling payment failed: %s', e)
     
     def handle_customer_created(self, customer_data):
         """
@@ -444,15 +909,15 @@ class PaymentService:
             email = customer_data['email']
             
             # Find user by email and update customer ID if not set
-            user = User.query.filter_by(email=email).first()
+            user = self._find_user(email=email)
             if user and not user.stripe_customer_id:
                 user.stripe_customer_id = customer_id
-                db.session.commit()
-                logger.info(f'Linked customer {customer_id} to user {user.id}')
+                self._commit()
+                logger.info('Linked customer %s to user %s', customer_id, user.id)
             
         except Exception as e:
-            logger.error(f'Error handling customer created: {str(e)}')
-            db.session.rollback()
+            logger.error('Error handling customer created: %s', e)
+            self._rollback()
     
     def handle_customer_updated(self, customer_data):
         """
@@ -465,7 +930,7 @@ class PaymentService:
             customer_id = customer_data['id']
             
             # Find user by customer ID
-            user = User.query.filter_by(stripe_customer_id=customer_id).first()
+            user = self._find_user(stripe_customer_id=customer_id)
             if user:
                 # Update user info if email changed
                 if customer_data.get('email') and customer_data['email'] != user.email:
@@ -474,12 +939,12 @@ class PaymentService:
                 if customer_data.get('name') and customer_data['name'] != user.name:
                     user.name = customer_data['name']
                 
-                db.session.commit()
-                logger.info(f'Updated customer info for user {user.id}')
+                self._commit()
+                logger.info('Updated customer info for user %s', user.id)
             
         except Exception as e:
-            logger.error(f'Error handling customer updated: {str(e)}')
-            db.session.rollback()
+            logger.error('Error handling customer updated: %s', e)
+            self._rollback()
     
     def _get_tier_from_subscription(self, subscription_data):
         """
@@ -494,25 +959,17 @@ class PaymentService:
         try:
             # Get the price ID from the subscription
             if subscription_data.get('items') and subscription_data['items']['data']:
-                price_id = subscription_data['items']['data'][0]['price']['id']
-                
-                # Get the product to check metadata
-                price = stripe.Price.retrieve(price_id)
-                product = stripe.Product.retrieve(price.product)
-                
-                # Check product metadata for tier information
-                tier_mapping = {
-                    'pro': UserTier.PRO,
-                    'enterprise': UserTier.ENTERPRISE,
-                    'premium': UserTier.PRO,
-                    'business': UserTier.ENTERPRISE
-                }
+                price = subscription_data['items']['data'][0]['price']
+                product = price.get('product')
                 
-                tier_name = product.metadata.get('tier', '').lower()
-                return tier_mapping.get(tier_name, UserTier.PRO)  # Default to PRO for paid
+                # Use the product when the payload already has it expanded;
+                # otherwise resolve (and remember) the price's tier
+                if product and not isinstance(product, str):
+                    return _tier_from_product(product)
+                return _tier_for_price_id(price['id'])
             
             return UserTier.PRO  # Default for any paid subscription
             
         except Exception as e:
-            logger.error(f'Error determining tier from subscription: {str(e)}')
+            logger.error('Error determining tier from subscription: %s', e)
             return UserTier.PRO  # Default fallback
@@ -1,17 +1,36 @@
+import os
+import ast
 import time
-import json
 import logging
-from celery import current_task
+import orjson
+from celery import current_task, group
+from celery.exceptions import TimeoutError
 from app import celery
-from app.models import CVStatus
+from app.models import db, User, CVStatus
+from app.services.auth_service import AuthService
 from app.services.cv_service import CVService
-from app.services.gemini_service import generate_cv_with_gemini, edit_cv_with_gemini
-from app.services.latex_service import compile_latex_to_pdf
-from sqlalchemy import text
+from app.services.payment_service import PaymentService
+from app.services.gemini_service import (
+    generate_cv_with_gemini, edit_cv_with_gemini, load_template
+)
+from app.services.latex_service import (
+    compile_latex_to_pdf, start_preamble_format, validate_latex_code, PDFLATEX_TIMEOUT
+)
+from sqlalchemy import text, select, func
 
 
 logger = logging.getLogger(__name__)
 
+# Stateless services shared by every task in this worker process
+cv_service = CVService()
+auth_service = AuthService()
+
+# Seconds between progress updates while a batch is running
+BATCH_POLL_INTERVAL = 0.5
+
+# Upper bound on how long a batch waits for its CVs, in seconds
+BATCH_CV_TIMEOUT = 30 * 60
+
 
 @celery.task(bind=True, name='generate_cv_task')
 def generate_cv_task(self, cv_id, user_data, job_description, template_name, user_tier):
@@ -25,7 +44,6 @@ def generate_cv_task(self, cv_id, user_data, job_description, template_name, use
         template_name (str): LaTeX template to use
         user_tier (str): User subscription tier
     """
-    cv_service = CVService()
     start_time = time.time()
     
     try:
@@ -37,8 +55,16 @@ def generate_cv_task(self, cv_id, user_data, job_description, template_name, use
             meta={'step': 'Generating CV content with AI', 'progress': 20}
         )
         
-        # Step 1: Generate LaTeX code using Gemini
-        latex_code = generate_cv_with_gemini(user_data, job_description, template_name)
+        # Step 1: Generate LaTeX code using Gemini, building the template
+        # preamble's format in the background while the body is still streaming
+        format_builds = []
+        template_latex = load_template(template_name)
+        latex_code = generate_cv_with_gemini(
+            user_data, job_description, template_name,
+            on_preamble=lambda preamble: format_builds.append(
+                start_preamble_format(preamble, template_latex)
+            )
+        )
         
         if not latex_code:
             raise Exception("Failed to generate LaTeX code with Gemini")
@@ -52,11 +78,18 @@ def generate_cv_task(self, cv_id, user_data, job_description, template_name, use
         )
         
         # Step 2: Compile LaTeX to PDF
-        from app.models import CV
-        cv = CV.query.get(cv_id)
+        cv = cv_service.get_cv_by_id(cv_id)
         if not cv:
             raise Exception(f"CV {cv_id} not found in database")
         
+        # Reject unusable or unsafe LaTeX before spending a pdflatex run on it
+        is_valid, errors = validate_latex_code(latex_code)
+        if not is_valid:
+            raise Exception(f"Generated LaTeX is invalid: {'; '.join(errors)}")
+        
+        for build in filter(None, format_builds):
+            build.join(PDFLATEX_TIMEOUT)
+        
         pdf_path, jpg_path = compile_latex_to_pdf(cv.uuid, latex_code, user_tier)
         
         logger.info(f'Compiled PDF for CV {cv_id}')
@@ -130,15 +163,13 @@ def edit_cv_task(self, cv_id, edit_instructions, user_tier):
         edit_instructions (str): Instructions for editing the CV
         user_tier (str): User subscription tier
     """
-    cv_service = CVService()
     start_time = time.time()
     
     try:
         logger.info(f'Starting CV editing for CV {cv_id}')
         
         # Get existing CV
-        from app.models import CV
-        cv = CV.query.get(cv_id)
+        cv = cv_service.get_cv_by_id(cv_id)
         if not cv:
             raise Exception(f"CV {cv_id} not found in database")
         
@@ -153,9 +184,8 @@ def edit_cv_task(self, cv_id, edit_instructions, user_tier):
             raise Exception("No existing LaTeX code found for editing")
         
         # Parse user data back to dict
-        try:
-            user_data = json.loads(cv.user_data) if isinstance(cv.user_data, str) else cv.user_data
-        except json.JSONDecodeError:
+        user_data = _load_user_data(cv.user_data)
+        if user_data is None:
             raise Exception("Invalid user data format in CV record")
         
         self.update_state(
@@ -181,10 +211,18 @@ def edit_cv_task(self, cv_id, edit_instructions, user_tier):
             meta={'step': 'Compiling updated PDF', 'progress': 70}
         )
         
-        # Step 2: Compile edited LaTeX to PDF
-        pdf_path, jpg_path = compile_latex_to_pdf(cv.uuid, edited_latex_code, user_tier)
-        
-        logger.info(f'Compiled edited PDF for CV {cv_id}')
+        # Step 2: Compile edited LaTeX to PDF, unless the source is unchanged
+        # (a no-op edit, or Gemini failing and handing back the original)
+        reused = _reusable_outputs(cv, edited_latex_code, user_tier)
+        if reused:
+            pdf_path, jpg_path = reused
+            logger.info(f'LaTeX unchanged for CV {cv_id}, reusing existing PDF')
+        else:
+            is_valid, errors = validate_latex_code(edited_latex_code)
+            if not is_valid:
+                raise Exception(f"Edited LaTeX is invalid: {'; '.join(errors)}")
+            pdf_path, jpg_path = compile_latex_to_pdf(cv.uuid, edited_latex_code, user_tier)
+            logger.info(f'Compiled edited PDF for CV {cv_id}')
         
         # Update progress
         self.update_state(
@@ -245,6 +283,56 @@ def edit_cv_task(self, cv_id, edit_instructions, user_tier):
         raise Exception(error_message)
 
 
+def _load_user_data(raw):
+    """
+    Parse a CV's stored user_data back into a dict.
+    
+    Rows stored before user_data was written as JSON hold the Python repr
+    of the dict instead, which json can't read; those are parsed as
+    Python literals.
+    
+    Args:
+        raw (str): Stored user_data column
+        
+    Returns:
+        dict: User data, or None if it can't be parsed
+    """
+    if not isinstance(raw, str):
+        return raw
+    
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        pass
+    
+    try:
+        return ast.literal_eval(raw)
+    except (ValueError, SyntaxError, RecursionError):
+        return None
+
+
+def _reusable_outputs(cv, latex_code, user_tier):
+    """
+    Get a CV's current files if they were compiled from this exact source.
+    
+    Args:
+        cv (CV): CV record before the edit
+        latex_code (str): LaTeX source about to be compiled
+        user_tier (str): User subscription tier
+        
+    Returns:
+        tuple: (pdf_path, jpg_path), or None if a compile is needed
+    """
+    if latex_code != cv.latex_code or not cv.pdf_path or not os.path.exists(cv.pdf_path):
+        return None
+    
+    # Free users also need the preview the compile would have made
+    if user_tier == 'free' and not (cv.jpg_path and os.path.exists(cv.jpg_path)):
+        return None
+    
+    return cv.pdf_path, cv.jpg_path
+
+
 @celery.task(name='cleanup_task')
 def cleanup_task():
     """
@@ -254,12 +342,9 @@ def cleanup_task():
         logger.info('Starting cleanup task')
         
         # Cleanup expired tokens
-        from app.services.auth_service import AuthService
-        auth_service = AuthService()
         token_cleanup_result = auth_service.cleanup_expired_tokens()
         
         # Cleanup orphaned files
-        cv_service = CVService()
         file_cleanup_result = cv_service.cleanup_orphaned_files()
         
         result = {
@@ -283,6 +368,37 @@ def cleanup_task():
         }
 
 
+@celery.task(name='delete_cv_files_task', ignore_result=True)
+def delete_cv_files_task(pdf_path, jpg_path):
+    """
+    Delete a CV's files after its database record has been removed.
+    
+    Args:
+        pdf_path (str): Stored PDF path (may be None)
+        jpg_path (str): Stored JPG path (may be None)
+    """
+    try:
+        cv_service.delete_cv_file_paths(pdf_path, jpg_path)
+    except Exception as e:
+        logger.error(f'CV file deletion failed: {str(e)}')
+
+
+@celery.task(name='process_webhook_queue_task', ignore_result=True)
+def process_webhook_queue_task():
+    """
+    Apply queued Stripe webhook events in batches.
+    """
+    try:
+        payment_service = PaymentService()
+        
+        # Drain whatever has built up since the last run
+        while payment_service.process_webhook_queue():
+            pass
+        
+    except Exception as e:
+        logger.error(f'Webhook queue processing failed: {str(e)}')
+
+
 @celery.task(name='health_check_task')
 def health_check_task():
     """
@@ -290,7 +406,6 @@ def health_check_task():
     """
     try:
         # Basic health checks
-        from app.models import db, User
         
         # Check database connection
         try:
@@ -301,7 +416,7 @@ def health_check_task():
         
         # Check if we can access models
         try:
-            user_count = User.query.count()
+            user_count = _estimated_user_count()
             model_status = 'healthy'
         except Exception as e:
             model_status = f'unhealthy: {str(e)}'
@@ -331,6 +446,27 @@ def health_check_task():
         }
 
 
+def _estimated_user_count():
+    """
+    Count users cheaply for the health check.
+    
+    PostgreSQL reads the planner's row estimate from pg_class instead of
+    scanning the table; other databases (and tables never analyzed, which
+    report -1) fall back to an exact count.
+    
+    Returns:
+        int: Approximate number of users
+    """
+    if db.engine.dialect.name == 'postgresql':
+        estimate = db.session.scalar(text(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = 'users'::regclass"
+        ))
+        if estimate is not None and estimate >= 0:
+            return estimate
+    
+    return db.session.scalar(select(func.count(User.id)))
+
+
 @celery.task(name='batch_cv_generation_task')
 def batch_cv_generation_task(cv_data_list):
     """
@@ -341,37 +477,55 @@ def batch_cv_generation_task(cv_data_list):
     """
     try:
         results = []
-        cv_service = CVService()
-        
-        for i, cv_data in enumerate(cv_data_list):
-            try:
-                # Update progress
-                progress = int((i / len(cv_data_list)) * 100)
-                current_task.update_state(
-                    state='PROGRESS',
-                    meta={'step': f'Processing CV {i+1}/{len(cv_data_list)}', 'progress': progress}
-                )
-                
-                # Generate individual CV
-                result = generate_cv_task.delay(
-                    cv_data['cv_id'],
-                    cv_data['user_data'],
-                    cv_data['job_description'],
-                    cv_data['template_name'],
-                    cv_data['user_tier']
-                ).get()  # Wait for completion
-                
+        total = len(cv_data_list)
+        
+        # Fan the CVs out across the worker pool instead of one at a time
+        group_result = group(
+            generate_cv_task.s(
+                cv_data['cv_id'],
+                cv_data['user_data'],
+                cv_data['job_description'],
+                cv_data['template_name'],
+                cv_data['user_tier']
+            )
+            for cv_data in cv_data_list
+        ).apply_async()
+        
+        deadline = time.monotonic() + BATCH_CV_TIMEOUT
+        while not group_result.ready() and time.monotonic() < deadline:
+            completed = group_result.completed_count()
+            current_task.update_state(
+                state='PROGRESS',
+                meta={
+                    'step': f'Processed {completed}/{total} CVs',
+                    'progress': int((completed / total) * 100) if total else 100
+                }
+            )
+            time.sleep(BATCH_POLL_INTERVAL)
+        
+        # Every child has finished (or the deadline passed), so this only
+        # collects results; failures come back as values, not raised
+        try:
+            group_result.join(
+                timeout=BATCH_POLL_INTERVAL,
+                propagate=False,
+                disable_sync_subtasks=False
+            )
+        except TimeoutError:
+            pass
+        
+        for cv_data, child in zip(cv_data_list, group_result.results):
+            if child.successful():
                 results.append({
                     'cv_id': cv_data['cv_id'],
                     'status': 'success',
-                    'result': result
+                    'result': child.result
                 })
-                
-            except Exception as e:
+            else:
                 results.append({
                     'cv_id': cv_data.get('cv_id', 'unknown'),
                     'status': 'failed',
-                    'error': str(e)
+                    'error': str(child.result) if child.ready() else 'Timed out'
                 })
         
         successful_count = len([r for r in results if r['status'] == 'success'])
@@ -411,6 +565,10 @@ celery.conf.beat_schedule = {
         'task': 'health_check_task',
         'schedule': crontab(minute='*/5'),  # Run every 5 minutes
     },
+    'process-webhooks-every-2-seconds': {
+        'task': 'process_webhook_queue_task',
+        'schedule': 2.0,  # Run every 2 seconds
+    },
 }
 
 celery.conf.timezone = 'UTC'
@@ -1,11 +1,50 @@
 from functools import wraps
-from flask import request, jsonify, current_app
-from app.services.auth_service import AuthService
+from flask import request, jsonify, current_app, make_response, Response
 from app.models import User, UserTier
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# jwt_required's 401 bodies, serialized once since they never change
+_MISSING_AUTH_BODY = json.dumps({
+    'error': 'Missing Authorization header',
+    'message': 'Authorization header is required'
+})
+_BAD_TOKEN_TYPE_BODY = json.dumps({
+    'error': 'Invalid token type',
+    'message': 'Authorization header must be in format: Bearer <token>'
+})
+_BAD_AUTH_FORMAT_BODY = json.dumps({
+    'error': 'Invalid Authorization header format',
+    'message': 'Authorization header must be in format: Bearer <token>'
+})
+_INVALID_TOKEN_BODY = json.dumps({
+    'error': 'Invalid or expired token',
+    'message': 'Please login again'
+})
+
+
+# Tier hierarchy used by subscription_required
+_TIER_LEVELS = {
+    UserTier.FREE: 0,
+    UserTier.PRO: 1,
+    UserTier.ENTERPRISE: 2
+}
+
+
+# Headers added by cors_headers
+_CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+)
+
+
+def _auth_error(body):
+    """Build a 401 JSON response from a pre-serialized body."""
+    return Response(body, status=401, mimetype='application/json')
+
 
 def jwt_required(f):
     """
@@ -21,34 +60,25 @@ def jwt_required(f):
         auth_header = request.headers.get('Authorization')
         
         if not auth_header:
-            return jsonify({
-                'error': 'Missing Authorization header',
-                'message': 'Authorization header is required'
-            }), 401
+            return _auth_error(_MISSING_AUTH_BODY)
         
-        # Extract token from "Bearer <token>" format
-        try:
-            token_type, token = auth_header.split(' ', 1)
+        # Extract token from "Bearer <token>" format; the exact scheme
+        # spelling skips the general parse
+        if auth_header.startswith('Bearer '):
+            token = auth_header[7:]
+        else:
+            token_type, sep, token = auth_header.partition(' ')
+            if not sep:
+                return _auth_error(_BAD_AUTH_FORMAT_BODY)
             if token_type.lower() != 'bearer':
-                return jsonify({
-                    'error': 'Invalid token type',
-                    'message': 'Authorization header must be in format: Bearer <token>'
-                }), 401
-        except ValueError:
-            return jsonify({
-                'error': 'Invalid Authorization header format',
-                'message': 'Authorization header must be in format: Bearer <token>'
-            }), 401
+                return _auth_error(_BAD_TOKEN_TYPE_BODY)
         
         # Validate token
-        auth_service = AuthService()
+        auth_service = current_app.extensions['auth_service']
         user, payload = auth_service.validate_user_token(token, 'access')
         
         if not user or not payload:
-            return jsonify({
-                'error': 'Invalid or expired token',
-                'message': 'Please login again'
-            }), 401
+            return _auth_error(_INVALID_TOKEN_BODY)
         
         # Add user and token info to request
         request.current_user = user
@@ -66,6 +96,11 @@ def subscription_required(tier=UserTier.PRO):
     Args:
         tier (UserTier): Minimum required subscription tier
     """
+    # Tiers that may use the route, worked out once per route
+    allowed_tiers = frozenset(
+        t for t, level in _TIER_LEVELS.items() if level >= _TIER_LEVELS.get(tier, 1)
+    )
+    
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
@@ -78,17 +113,7 @@ def subscription_required(tier=UserTier.PRO):
             
             user = request.current_user
             
-            # Define tier hierarchy
-            tier_levels = {
-                UserTier.FREE: 0,
-                UserTier.PRO: 1,
-                UserTier.ENTERPRISE: 2
-            }
-            
-            user_level = tier_levels.get(user.user_tier, 0)
-            required_level = tier_levels.get(tier, 1)
-            
-            if user_level < required_level:
+            if user.user_tier not in allowed_tiers:
                 return jsonify({
                     'error': 'Subscription required',
                     'message': f'This feature requires {tier.value} subscription',
@@ -143,19 +168,32 @@ def generation_limit_check(f):
         user = request.current_user
         
         if not user.can_generate_cv():
-            return jsonify({
-                'error': 'Generation limit exceeded',
-                'message': 'You have reached your CV generation limit',
-                'generations_left': user.generations_left,
-                'user_tier': user.user_tier.value,
-                'upgrade_required': user.user_tier == UserTier.FREE
-            }), 403
+            return generation_limit_response(user)
         
         return f(*args, **kwargs)
     
     return decorated_function
 
 
+def generation_limit_response(user):
+    """
+    Build the 403 response for a user who has no generations left.
+    
+    Args:
+        user (User): User who hit the limit
+        
+    Returns:
+        tuple: (response, status)
+    """
+    return jsonify({
+        'error': 'Generation limit exceeded',
+        'message': 'You have reached your CV generation limit',
+        'generations_left': user.generations_left,
+        'user_tier': user.user_tier.value,
+        'upgrade_required': user.user_tier == UserTier.FREE
+    }), 403
+
+
 def admin_required(f):
     """
     Decorator to require admin privileges.
@@ -245,26 +283,9 @@ def cors_headers(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        response = f(*args, **kwargs)
-        
-        # If response is a tuple, get the response object
-        if isinstance(response, tuple):
-            resp_obj, status_code = response
-            if hasattr(resp_obj, 'headers'):
-                response_obj = resp_obj
-            else:
-                # Create response object
-                from flask import make_response
-                response_obj = make_response(resp_obj, status_code)
-        else:
-            response_obj = response
-        
-        # Add CORS headers
-        if hasattr(response_obj, 'headers'):
-            response_obj.headers['Access-Control-Allow-Origin'] = '*'
-            response_obj.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-            response_obj.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-        
-        return response_obj
+        # make_response handles bare bodies and (body, status[, headers]) tuples alike
+        response = make_response(f(*args, **kwargs))
+        response.headers.update(_CORS_HEADERS)
+        return response
     
     return decorated_function
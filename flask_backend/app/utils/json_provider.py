@@ -0,0 +1,26 @@
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider that encodes with orjson instead of the stdlib encoder.
+    
+    Types orjson does not handle natively (Decimal, objects with __html__,
+    etc.) still go through Flask's default hook.
+    """
+    
+    option = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+    
+    def _encode(self, obj):
+        return orjson.dumps(obj, default=self.default, option=self.option)
+    
+    def dumps(self, obj, **kwargs):
+        return self._encode(obj).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._encode(obj), mimetype=self.mimetype)
@@ -0,0 +1,178 @@
+import json
+import logging
+import redis
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+def get_redis():
+    """
+    Get the shared Redis client for the current application.
+    
+    The client (and its connection pool) is created on first use and
+    stored on the app so every request and task reuses it.
+    
+    Returns:
+        redis.Redis: Redis client
+    """
+    client = current_app.extensions.get('redis')
+    if client is None:
+        client = redis.Redis.from_url(current_app.config['REDIS_URL'])
+        current_app.extensions['redis'] = client
+    return client
+
+
+def get_durable_redis():
+    """
+    Get the Redis client for state that must not be evicted.
+    
+    The cache Redis evicts under memory pressure; queued work and dedupe
+    markers live on DURABLE_REDIS_URL instead (a noeviction instance in
+    production, the same Redis by default).
+    
+    Returns:
+        redis.Redis: Redis client
+    """
+    client = current_app.extensions.get('redis_durable')
+    if client is None:
+        client = redis.Redis.from_url(current_app.config['DURABLE_REDIS_URL'])
+        current_app.extensions['redis_durable'] = client
+    return client
+
+
+# Refill and take from token buckets in one step so every process shares
+# the same quota. KEYS are the buckets; ARGV holds (capacity, refill per
+# second, cost) per bucket. Takes from all of them or none, and returns
+# the seconds to wait when any bucket is short (0 when taken).
+_TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[3 * i - 2])
+    local rate = tonumber(ARGV[3 * i - 1])
+    local cost = tonumber(ARGV[3 * i])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[3 * i - 2])
+    local rate = tonumber(ARGV[3 * i - 1])
+    local tokens = levels[i]
+    if wait == 0 then
+        tokens = tokens - tonumber(ARGV[3 * i])
+    end
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return tostring(wait)
+"""
+
+
+def task_channel(task_id):
+    """Pub/sub channel that carries completion events for a Celery task."""
+    return f'cv:task:{task_id}'
+
+
+def publish_task_event(task_id, payload):
+    """
+    Publish a task status event to subscribers.
+    
+    Failures are logged and swallowed; subscribers fall back to polling.
+    
+    Args:
+        task_id (str): Celery task ID
+        payload (dict): JSON-serializable event data
+    """
+    if not task_id:
+        return
+    
+    try:
+        get_redis().publish(task_channel(task_id), json.dumps(payload))
+    except Exception as e:
+        logger.warning(f'Failed to publish task event for {task_id}: {str(e)}')
+
+
+def take_tokens(buckets):
+    """
+    Take tokens from shared Redis token buckets, all or nothing.
+    
+    Redis errors are logged and treated as a grant, so a Redis outage
+    never blocks the caller.
+    
+    Args:
+        buckets (list): (key, capacity, refill_per_second, cost) tuples
+        
+    Returns:
+        float: 0 if the tokens were taken, else seconds until they will be
+    """
+    keys, args = [], []
+    for key, capacity, refill_rate, cost in buckets:
+        keys.append(key)
+        # A cost above capacity could never be met
+        args.extend((capacity, refill_rate, min(cost, capacity)))
+    
+    try:
+        script = current_app.extensions.get('redis_token_bucket')
+        if script is None:
+            script = get_redis().register_script(_TOKEN_BUCKET_LUA)
+            current_app.extensions['redis_token_bucket'] = script
+        return float(script(keys=keys, args=args))
+    except Exception as e:
+        logger.warning(f'Token bucket check failed for {keys}: {str(e)}')
+        return 0.0
+
+
+def cache_get_json(key):
+    """
+    Read a JSON value from the cache.
+    
+    Args:
+        key (str): Cache key
+        
+    Returns:
+        Decoded value, or None on a miss or Redis error
+    """
+    try:
+        cached = get_redis().get(key)
+    except Exception as e:
+        logger.warning(f'Cache read failed for {key}: {str(e)}')
+        return None
+    
+    return json.loads(cached) if cached is not None else None
+
+
+def cache_set_json(key, value, ttl):
+    """
+    Store a JSON-serializable value in the cache with an expiry.
+    
+    Args:
+        key (str): Cache key
+        value: JSON-serializable value
+        ttl (int): Expiry in seconds
+    """
+    try:
+        get_redis().setex(key, ttl, json.dumps(value))
+    except Exception as e:
+        logger.warning(f'Cache write failed for {key}: {str(e)}')
+
+
+def cache_delete(key):
+    """
+    Remove a key from the cache.
+    
+    Args:
+        key (str): Cache key
+    """
+    try:
+        get_redis().delete(key)
+    except Exception as e:
+        logger.warning(f'Cache delete failed for {key}: {str(e)}')
@@ -1,5 +1,80 @@
 from marshmallow import Schema, fields, validate, validates_schema, ValidationError
+from functools import lru_cache
+from secrets import compare_digest
+from PIL import Image
+import io
 import re
+import uuid
+
+# Email format accepted in login and CV user_data, compiled once; use
+# fullmatch, since the pattern itself isn't anchored
+EMAIL_RE = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', re.ASCII)
+
+# Longest address is_valid_email accepts (RFC 5321 path limit)
+MAX_EMAIL_LENGTH = 254
+
+# Phone number format accepted by PhoneSchema (validate.Regexp uses match,
+# so it is anchored; \Z, unlike $, doesn't allow a trailing newline)
+PHONE_RE = re.compile(r'^\+?1?\d{9,15}\Z', re.ASCII)
+
+# Length of a canonical UUID string, the only form CV UUIDs are stored in
+UUID_LENGTH = 36
+
+# Largest image width/height validate_image_file accepts
+MAX_IMAGE_DIMENSION = 4096
+
+# LaTeX templates a CV may use, in display order
+TEMPLATE_NAMES = ('template_1', 'template_2', 'template_3', 'template_4')
+VALID_TEMPLATES = frozenset(TEMPLATE_NAMES)
+
+
+class OneOfSet(validate.OneOf):
+    """
+    OneOf validator that checks membership against a frozenset.
+    
+    Choices keep their given order for error messages.
+    """
+    
+    def __init__(self, choices, *args, **kwargs):
+        super().__init__(choices, *args, **kwargs)
+        self._choice_set = frozenset(self.choices)
+    
+    def __call__(self, value):
+        try:
+            if value not in self._choice_set:
+                raise ValidationError(self._format_error(value))
+        except TypeError as error:
+            # Unhashable input can't be one of the choices
+            raise ValidationError(self._format_error(value)) from error
+        return value
+
+
+def is_valid_email(email):
+    """
+    Check an email address against EMAIL_RE.
+    
+    Cheap string checks reject malformed input first, so the regex only
+    runs on addresses with a plausible shape and a bounded length.
+    
+    Args:
+        email (str): Address to check
+        
+    Returns:
+        bool: True if the address is valid
+    """
+    if not isinstance(email, str) or len(email) > MAX_EMAIL_LENGTH:
+        return False
+    
+    # EMAIL_RE needs exactly one '@' with text before it, and a dot with at
+    # least two characters after it somewhere past the '@'
+    at = email.find('@')
+    if at < 1 or email.find('@', at + 1) != -1:
+        return False
+    dot = email.rfind('.')
+    if dot < at + 2 or dot > len(email) - 3:
+        return False
+    
+    return EMAIL_RE.fullmatch(email) is not None
 
 
 class LoginSchema(Schema):
@@ -18,7 +93,7 @@ class LoginSchema(Schema):
         
         # Validate email format
         email = user_info.get('email')
-        if email and not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
+        if email and not is_valid_email(email):
             raise ValidationError('Invalid email format')
 
 
@@ -30,9 +105,7 @@ class TokenRefreshSchema(Schema):
 class CVCreateSchema(Schema):
     """Schema for CV creation requests."""
     title = fields.Str(validate=validate.Length(min=1, max=200), missing='My CV')
-    template_name = fields.Str(required=True, validate=validate.OneOf([
-        'template_1', 'template_2', 'template_3', 'template_4'
-    ]))
+    template_name = fields.Str(required=True, validate=OneOfSet(TEMPLATE_NAMES))
     user_data = fields.Dict(required=True)
     job_description = fields.Str(required=True, validate=validate.Length(min=10, max=5000))
     
@@ -47,7 +120,7 @@ class CVCreateSchema(Schema):
         
         # Validate email in user data
         email = user_data.get('email')
-        if email and not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
+        if email and not is_valid_email(email):
             raise ValidationError('Invalid email format in user_data')
 
 
@@ -61,19 +134,19 @@ class CVUpdateSchema(Schema):
     @validates_schema
     def validate_update_data(self, data, **kwargs):
         # At least one field should be provided for update
-        if not any([
-            data.get('title'),
-            data.get('user_data'),
-            data.get('job_description'),
-            data.get('edit_instructions')
-        ]):
+        if not (
+            data.get('title')
+            or data.get('user_data')
+            or data.get('job_description')
+            or data.get('edit_instructions')
+        ):
             raise ValidationError('At least one field must be provided for update')
         
         # If user_data is provided, validate email
         user_data = data.get('user_data')
         if user_data and user_data.get('email'):
             email = user_data['email']
-            if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
+            if not is_valid_email(email):
                 raise ValidationError('Invalid email format in user_data')
 
 
@@ -92,7 +165,7 @@ class UserUpdateSchema(Schema):
     @validates_schema
     def validate_update_fields(self, data, **kwargs):
         # At least one field should be provided for update
-        if not any([data.get('name'), data.get('email')]):
+        if not (data.get('name') or data.get('email')):
             raise ValidationError('At least one field must be provided for update')
 
 
@@ -100,26 +173,28 @@ class PaginationSchema(Schema):
     """Schema for pagination parameters."""
     page = fields.Int(validate=validate.Range(min=1), missing=1)
     per_page = fields.Int(validate=validate.Range(min=1, max=100), missing=10)
-    sort_by = fields.Str(validate=validate.OneOf([
+    sort_by = fields.Str(validate=OneOfSet((
         'created_at', 'updated_at', 'title', 'status'
-    ]), missing='created_at')
-    sort_order = fields.Str(validate=validate.OneOf(['asc', 'desc']), missing='desc')
+    )), missing='created_at')
+    sort_order = fields.Str(validate=OneOfSet(('asc', 'desc')), missing='desc')
 
 
 class CVFilterSchema(PaginationSchema):
     """Schema for CV listing with filters."""
-    status = fields.Str(validate=validate.OneOf([
+    status = fields.Str(validate=OneOfSet((
         'pending', 'processing', 'success', 'failed'
-    ]))
-    template_name = fields.Str(validate=validate.OneOf([
-        'template_1', 'template_2', 'template_3', 'template_4'
-    ]))
+    )))
+    template_name = fields.Str(validate=OneOfSet(TEMPLATE_NAMES))
     search = fields.Str(validate=validate.Length(max=100))
+    fast_page = fields.Bool(missing=False)
+    include_total = fields.Bool(missing=False)
+    after_created_at = fields.DateTime()
+    after_id = fields.Int(validate=validate.Range(min=1))
 
 
 class FileUploadSchema(Schema):
     """Schema for file upload validation."""
-    file_type = fields.Str(validate=validate.OneOf(['pdf', 'jpg', 'png']))
+    file_type = fields.Str(validate=OneOfSet(('pdf', 'jpg', 'png')))
     max_size = fields.Int(validate=validate.Range(min=1))
 
 
@@ -144,10 +219,15 @@ class PasswordChangeSchema(Schema):
     
     @validates_schema
     def validate_passwords(self, data, **kwargs):
-        if data.get('new_password') != data.get('confirm_password'):
+        # Constant-time comparisons; encoded, since compare_digest only takes
+        # ASCII str (the fields are required, so they're present here)
+        current_password = data['current_password'].encode()
+        new_password = data['new_password'].encode()
+        
+        if not compare_digest(new_password, data['confirm_password'].encode()):
             raise ValidationError('New password and confirmation do not match')
         
-        if data.get('current_password') == data.get('new_password'):
+        if compare_digest(current_password, new_password):
             raise ValidationError('New password must be different from current password')
 
 
@@ -163,17 +243,17 @@ class FeedbackSchema(Schema):
     """Schema for user feedback submissions."""
     rating = fields.Int(required=True, validate=validate.Range(min=1, max=5))
     comment = fields.Str(validate=validate.Length(max=1000))
-    category = fields.Str(validate=validate.OneOf([
+    category = fields.Str(validate=OneOfSet((
         'general', 'bug_report', 'feature_request', 'performance', 'ui_ux'
-    ]), missing='general')
+    )), missing='general')
 
 
 class BulkOperationSchema(Schema):
     """Schema for bulk operations on CVs."""
     cv_ids = fields.List(fields.Int(), required=True, validate=validate.Length(min=1, max=50))
-    operation = fields.Str(required=True, validate=validate.OneOf([
+    operation = fields.Str(required=True, validate=OneOfSet((
         'delete', 'export', 'archive'
-    ]))
+    )))
 
 
 class SearchSchema(Schema):
@@ -191,7 +271,7 @@ class EmailSchema(Schema):
 class PhoneSchema(Schema):
     """Schema for phone number validation."""
     phone = fields.Str(required=True, validate=validate.Regexp(
-        r'^\+?1?\d{9,15}$',
+        PHONE_RE,
         error='Invalid phone number format'
     ))
 
@@ -213,17 +293,25 @@ class DateRangeSchema(Schema):
 # Custom validation functions
 def validate_template_name(template_name):
     """Validate template name format."""
-    valid_templates = ['template_1', 'template_2', 'template_3', 'template_4']
-    if template_name not in valid_templates:
-        raise ValidationError(f'Invalid template name. Must be one of: {", ".join(valid_templates)}')
+    if template_name not in VALID_TEMPLATES:
+        raise ValidationError(f'Invalid template name. Must be one of: {", ".join(TEMPLATE_NAMES)}')
 
 
-def validate_cv_uuid(cv_uuid):
-    """Validate CV UUID format."""
-    import uuid
+@lru_cache(maxsize=4096)
+def _is_uuid(value):
+    """Parse a canonical UUID string once; polled CVs hit the cache."""
     try:
-        uuid.UUID(cv_uuid)
+        uuid.UUID(value)
     except ValueError:
+        return False
+    return True
+
+
+def validate_cv_uuid(cv_uuid):
+    """Validate CV UUID format."""
+    # Anything not shaped like a canonical UUID is rejected before parsing
+    if (not isinstance(cv_uuid, str) or len(cv_uuid) != UUID_LENGTH
+            or cv_uuid[8] != '-' or not _is_uuid(cv_uuid)):
         raise ValidationError('Invalid CV UUID format')
 
 
@@ -240,19 +328,19 @@ def validate_file_extension(filename, allowed_extensions):
 def validate_image_file(file_data):
     """Validate image file data."""
     try:
-        from PIL import Image
-        import io
-        
-        # Try to open the image
-        image = Image.open(io.BytesIO(file_data))
-        image.verify()
-        
-        # Check dimensions
-        if image.size[0] > 4096 or image.size[1] > 4096:
-            raise ValidationError('Image dimensions too large (max 4096x4096)')
-        
+        # Opening only parses the header, which is enough for the size
+        with Image.open(io.BytesIO(file_data)) as image:
+            width, height = image.size
+            if width <= MAX_IMAGE_DIMENSION and height <= MAX_IMAGE_DIMENSION:
+                # Structural check (chunk CRCs etc.); pixels aren't decoded
+                image.verify()
     except Exception:
         raise ValidationError('Invalid image file')
+    
+    if width > MAX_IMAGE_DIMENSION or height > MAX_IMAGE_DIMENSION:
+        raise ValidationError(
+            f'Image dimensions too large (max {MAX_IMAGE_DIMENSION}x{MAX_IMAGE_DIMENSION})'
+        )
 
 
 def validate_json_structure(data, required_keys):
@@ -265,13 +353,11 @@ def validate_json_structure(data, required_keys):
 # Error formatting helper
 def format_validation_errors(errors):
     """Format marshmallow validation errors for API response."""
-    formatted_errors = {}
-    
-    for field, messages in errors.items():
-        if isinstance(messages, list):
-            formatted_errors[field] = messages[0]  # Take first error message
-        else:
-            formatted_errors[field] = str(messages)
+    # Take each field's first message; nested schemas give a dict instead
+    formatted_errors = {
+        field: messages[0] if type(messages) is list else str(messages)
+        for field, messages in errors.items()
+    }
     
     return {
         'error': 'Validation failed',
@@ -6,6 +6,7 @@ with proper worker management, logging, and security settings.
 """
 
 import os
+import gc
 import multiprocessing
 
 # Server socket
@@ -13,18 +14,31 @@ bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
 backlog = 2048
 
 # Worker processes
-workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
-worker_class = "sync"
+# Requests mostly wait on the database, Redis, Stripe and Gemini, so each
+# worker serves several at once on threads; fewer processes are needed and
+# more memory stays shared with the preloaded master
+workers = int(os.environ.get('GUNICORN_WORKERS', max(2, multiprocessing.cpu_count())))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
 worker_connections = 1000
-max_requests = 1000
-max_requests_jitter = 50
 preload_app = True
 timeout = 60
 keepalive = 2
 
-# Restart workers after this many requests, to help prevent memory leaks
-max_requests = 1000
-max_requests_jitter = 50
+# Size each worker's database pool for its threads (read by the app config,
+# which is loaded after this file because of preload_app)
+os.environ.setdefault('DB_POOL_CONCURRENCY', str(threads))
+
+# Workers touch their heartbeat file constantly; keep it in memory when the
+# host has /dev/shm, so a slow disk can't stall them
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# Restart workers after this many requests, to help prevent memory leaks.
+# Every restart refork loses the pages shared with the master, so recycle
+# rarely and only lower this if worker memory actually grows
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
 
 # Restart workers after this much time has passed
 max_worker_lifetime = 12 * 60 * 60  # 12 hours
@@ -70,6 +84,9 @@ def worker_int(worker):
 
 def pre_fork(server, worker):
     """Called just before a worker is forked."""
+    # Move the preloaded app's objects out of the collector's reach, so
+    # collections in the workers never write to (and un-share) their pages
+    gc.freeze()
     server.log.info("Worker spawned (pid: %s)", worker.pid)
 
 def post_fork(server, worker):
@@ -95,9 +112,6 @@ elif os.environ.get('FLASK_ENV') == 'production':
     reload = False
     preload_app = True
     
-    # Performance optimizations
-    worker_tmp_dir = '/dev/shm'  # Use shared memory for better performance
-    
     # Security enhancements
     forwarded_allow_ips = '*'
     secure_scheme_headers = {
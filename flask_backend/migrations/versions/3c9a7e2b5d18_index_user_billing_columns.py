@@ -0,0 +1,77 @@
+"""index user billing columns used by stripe webhooks
+
+Revision ID: 3c9a7e2b5d18
+Revises: 8e1f4c6a9d3b
+Create Date: 2025-06-30 09:41:17.562083
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9a7e2b5d18'
+down_revision = '8e1f4c6a9d3b'
+branch_labels = None
+depends_on = None
+
+
+def _is_postgresql():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+# Name the unique index is built under before it replaces the old one
+_TMP_INDEX = 'ix_users_stripe_customer_id_unique'
+
+
+def _check_no_duplicate_customers():
+    """Fail before touching any index if a customer ID is used twice."""
+    duplicates = op.get_bind().execute(sa.text(
+        'SELECT stripe_customer_id FROM users WHERE stripe_customer_id IS NOT NULL '
+        'GROUP BY stripe_customer_id HAVING COUNT(*) > 1 LIMIT 5'
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(
+            'users.stripe_customer_id has duplicates (e.g. %s); merge them '
+            'before making the index unique' % ', '.join(duplicates)
+        )
+
+
+def upgrade():
+    _check_no_duplicate_customers()
+    
+    if _is_postgresql():
+        # CONCURRENTLY cannot run inside a transaction block. The unique
+        # index is built under a temporary name first, so the old index
+        # stays in place if the build fails
+        with op.get_context().autocommit_block():
+            # Left INVALID by an interrupted earlier run, if any
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {_TMP_INDEX}')
+            op.create_index(_TMP_INDEX, 'users', ['stripe_customer_id'],
+                            unique=True, postgresql_concurrently=True)
+            op.drop_index('ix_users_stripe_customer_id', table_name='users',
+                          postgresql_concurrently=True)
+            op.execute(f'ALTER INDEX {_TMP_INDEX} RENAME TO ix_users_stripe_customer_id')
+            op.create_index('ix_users_subscription_id', 'users', ['subscription_id'],
+                            unique=False, postgresql_concurrently=True)
+    else:
+        with op.batch_alter_table('users', schema=None) as batch_op:
+            batch_op.drop_index('ix_users_stripe_customer_id')
+            batch_op.create_index('ix_users_stripe_customer_id', ['stripe_customer_id'], unique=True)
+            batch_op.create_index('ix_users_subscription_id', ['subscription_id'], unique=False)
+
+
+def downgrade():
+    if _is_postgresql():
+        with op.get_context().autocommit_block():
+            op.drop_index('ix_users_subscription_id', table_name='users',
+                          postgresql_concurrently=True)
+            op.drop_index('ix_users_stripe_customer_id', table_name='users',
+                          postgresql_concurrently=True)
+            op.create_index('ix_users_stripe_customer_id', 'users', ['stripe_customer_id'],
+                            unique=False, postgresql_concurrently=True)
+    else:
+        with op.batch_alter_table('users', schema=None) as batch_op:
+            batch_op.drop_index('ix_users_subscription_id')
+            batch_op.drop_index('ix_users_stripe_customer_id')
+            batch_op.create_index('ix_users_stripe_customer_id', ['stripe_customer_id'], unique=False)
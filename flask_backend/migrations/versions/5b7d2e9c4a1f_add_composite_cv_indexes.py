@@ -0,0 +1,67 @@
+"""add composite cv indexes and trigram search indexes
+
+Revision ID: 5b7d2e9c4a1f
+Revises: 1f303c3e9a88
+Create Date: 2025-06-24 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7d2e9c4a1f'
+down_revision = '1f303c3e9a88'
+branch_labels = None
+depends_on = None
+
+
+COMPOSITE_INDEXES = [
+    ('idx_cv_user_created', ['user_id', 'created_at']),
+    ('idx_cv_user_status', ['user_id', 'status']),
+    ('idx_cv_user_template', ['user_id', 'template_name']),
+]
+
+TRIGRAM_INDEXES = [
+    ('idx_cv_title_trgm', 'title'),
+    ('idx_cv_user_data_trgm', 'user_data'),
+    ('idx_cv_job_description_trgm', 'job_description'),
+]
+
+
+def _is_postgresql():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade():
+    if _is_postgresql():
+        # CONCURRENTLY cannot run inside a transaction block
+        with op.get_context().autocommit_block():
+            for name, columns in COMPOSITE_INDEXES:
+                op.create_index(name, 'cvs', columns, unique=False,
+                                postgresql_concurrently=True)
+
+            op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for name, column in TRIGRAM_INDEXES:
+                op.execute(
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+                    f'ON cvs USING gin ({column} gin_trgm_ops)'
+                )
+    else:
+        with op.batch_alter_table('cvs', schema=None) as batch_op:
+            for name, columns in COMPOSITE_INDEXES:
+                batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    if _is_postgresql():
+        with op.get_context().autocommit_block():
+            for name, _ in TRIGRAM_INDEXES:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+            for name, _ in COMPOSITE_INDEXES:
+                op.drop_index(name, table_name='cvs',
+                              postgresql_concurrently=True)
+    else:
+        with op.batch_alter_table('cvs', schema=None) as batch_op:
+            for name, _ in COMPOSITE_INDEXES:
+                batch_op.drop_index(name)
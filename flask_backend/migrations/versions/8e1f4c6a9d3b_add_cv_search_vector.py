@@ -0,0 +1,63 @@
+"""add full-text search vector to cvs
+
+Revision ID: 8e1f4c6a9d3b
+Revises: 5b7d2e9c4a1f
+Create Date: 2025-06-26 14:03:52.927410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8e1f4c6a9d3b'
+down_revision = '5b7d2e9c4a1f'
+branch_labels = None
+depends_on = None
+
+
+def _is_postgresql():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade():
+    if not _is_postgresql():
+        with op.batch_alter_table('cvs', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('search_vector', sa.Text(), nullable=True))
+        return
+
+    op.add_column('cvs', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+    # Keep the vector in sync on every insert/update
+    op.execute(
+        "CREATE TRIGGER cvs_search_vector_update BEFORE INSERT OR UPDATE ON cvs "
+        "FOR EACH ROW EXECUTE FUNCTION tsvector_update_trigger("
+        "search_vector, 'pg_catalog.english', title, user_data, job_description)"
+    )
+
+    # Backfill existing rows
+    op.execute(
+        "UPDATE cvs SET search_vector = to_tsvector('pg_catalog.english', "
+        "coalesce(title, '') || ' ' || coalesce(user_data, '') || ' ' || "
+        "coalesce(job_description, ''))"
+    )
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cv_search_vector '
+            'ON cvs USING gin (search_vector)'
+        )
+
+
+def downgrade():
+    if not _is_postgresql():
+        with op.batch_alter_table('cvs', schema=None) as batch_op:
+            batch_op.drop_column('search_vector')
+        return
+
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS idx_cv_search_vector')
+
+    op.execute('DROP TRIGGER IF EXISTS cvs_search_vector_update ON cvs')
+    op.drop_column('cvs', 'search_vector')
@@ -13,24 +13,10 @@ from app import create_app, celery
 # Add the current directory to Python path
 sys.path.insert(0, os.path.dirname(__file__))
 
-# Create Flask app instance
+# Create Flask app instance (this also configures celery, including the
+# task base class that runs tasks in the app context)
 app = create_app()
 
-def make_celery(app):
-    """Create Celery instance with Flask app context."""
-    celery.conf.update(app.config)
-    
-    class ContextTask(celery.Task):
-        def __call__(self, *args, **kwargs):
-            with app.app_context():
-                return self.run(*args, **kwargs)
-    
-    celery.Task = ContextTask
-    return celery
-
-# Configure Celery with Flask app
-celery = make_celery(app)
-
 @app.shell_context_processor
 def make_shell_context():
     """Provide shell context for flask shell command."""
@@ -109,17 +95,17 @@ def test_services():
     print("Testing services...")
     
     try:
-        # Test database connection
+        # Test database connection (straight on a pooled connection, no ORM)
         from app.models import db
-        db.session.execute('SELECT 1')
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('SELECT 1')
         print("✓ Database connection successful")
         
-        # Test Redis connection (via Celery)
-        from app.tasks.cv_tasks import health_check_task
-        result = health_check_task.delay()
-        health_status = result.get(timeout=10)
-        if health_status['status'] == 'healthy':
-            print("✓ Celery/Redis connection successful")
+        # Test Redis connection (via Celery): a broker ping answered by the
+        # workers, instead of queueing a task and waiting on its result
+        replies = celery.control.ping(timeout=1.0)
+        if replies:
+            print(f"✓ Celery/Redis connection successful ({len(replies)} worker(s))")
         else:
             print("✗ Celery/Redis connection failed")
         
@@ -151,9 +137,12 @@ if __name__ == '__main__':
     print(f"Debug mode: {debug}")
     print(f"Environment: {os.environ.get('FLASK_ENV', 'development')}")
     
+    # The watchdog reloader waits for file-change events instead of
+    # stat()ing every loaded module each second
     app.run(
         host='0.0.0.0',
         port=port,
         debug=debug,
-        threaded=True
+        threaded=True,
+        reloader_type='watchdog'
     )